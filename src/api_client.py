@@ -0,0 +1,98 @@
+import time
+import random
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+
+# ------------------ CONFIG ------------------
+# NOAA CDO allows 5 requests/second per token (and 10,000/day, which resumable pages make safe to hit)
+NOAA_REQUESTS_PER_SECOND = 5
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = 30
+
+
+# ------------------ RATE LIMITING ------------------
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker calling the same API."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` are available, then consume them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self, tokens=1):
+        """Consume `tokens` if available right now; never blocks."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+# ------------------ SESSION ------------------
+def build_session(pool_size=10, headers=None):
+    """Keep-alive session whose connection pool is sized for `pool_size` workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def _retry_delay(response, attempt, backoff):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+
+# Fetches run on many threads at once, so they skip the process-wide peak-RSS reset
+@instrumentation.traced("fetch", memory=False)
+def get_with_retry(session, url, params=None, limiter=None, max_retries=5, backoff=1.0, timeout=DEFAULT_TIMEOUT):
+    """GET through the shared limiter, retrying with exponential backoff on 429/5xx and connection errors."""
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+
+        response = None
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response
+            error = requests.exceptions.HTTPError(f"{response.status_code} for {response.url}", response=response)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+
+        if attempt == max_retries:
+            raise error
+        delay = _retry_delay(response, attempt, backoff)
+        logging.warning(f"Retrying in {delay:.1f}s after: {error}")
+        time.sleep(delay)
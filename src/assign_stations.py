@@ -5,6 +5,8 @@ import pandas as pd
 from dotenv import load_dotenv
 import logging
 
+from api_client import TokenBucket, build_session, get_with_retry, NOAA_REQUESTS_PER_SECOND
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(message)s')
 
@@ -34,8 +36,9 @@ CENTRAL_VALLEY_FIPS = {
 
 BASE_URL = "https://www.ncdc.noaa.gov/cdo-web/api/v2/stations"
 
-def fetch_stations_for_county(county, fips):
+def fetch_stations_for_county(county, fips, session=None, limiter=None):
     """Fetch stations for a given county FIPS code."""
+    session = session or build_session(headers=HEADERS)
     location_id = f"FIPS:06{fips}"
     params = {
         "datasetid": "GHCND",
@@ -46,8 +49,7 @@ def fetch_stations_for_county(county, fips):
     }
     try:
         logging.debug(f"Requesting stations for {county} (FIPS: {fips})")
-        response = requests.get(BASE_URL, headers=HEADERS, params=params, timeout=30)
-        response.raise_for_status()
+        response = get_with_retry(session, BASE_URL, params=params, limiter=limiter)
         data = response.json().get("results", [])
         for station in data:
             station["county"] = county
@@ -57,25 +59,37 @@ def fetch_stations_for_county(county, fips):
         logging.error(f"✗ Failed to fetch stations for {county}: {e}")
         return []
 
-# Prepare output directory
-output_dir = "data/raw/county_station_batches"
-os.makedirs(output_dir, exist_ok=True)
+OUTPUT_DIR = "data/raw/county_station_batches"
+COMBINED_PATH = "data/raw/cv_county_stations_all.csv"
+REQUEST_DELAY = 1  # seconds between counties, on top of the shared NOAA rate limit
+
+
+def collect_stations(output_dir=OUTPUT_DIR, combined_path=COMBINED_PATH, delay=REQUEST_DELAY,
+                     requests_per_second=NOAA_REQUESTS_PER_SECOND):
+    # Prepare output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    session = build_session(headers=HEADERS)
+    limiter = TokenBucket(requests_per_second)
+
+    # Loop through counties one at a time with delay
+    all_stations = []
+    for county, fips in CENTRAL_VALLEY_FIPS.items():
+        stations = fetch_stations_for_county(county, fips, session, limiter)
+        if stations:
+            df = pd.json_normalize(stations)
+            csv_path = os.path.join(output_dir, f"stations_{county.replace(' ', '_')}.csv")
+            df.to_csv(csv_path, index=False)
+            logging.debug(f"Saved {csv_path}")
+            all_stations.extend(stations)
+        time.sleep(delay)
 
-# Loop through counties one at a time with delay
-all_stations = []
-for county, fips in CENTRAL_VALLEY_FIPS.items():
-    stations = fetch_stations_for_county(county, fips)
-    if stations:
-        df = pd.json_normalize(stations)
-        csv_path = os.path.join(output_dir, f"stations_{county.replace(' ', '_')}.csv")
-        df.to_csv(csv_path, index=False)
-        logging.debug(f"Saved {csv_path}")
-        all_stations.extend(stations)
-    time.sleep(1)  # 1 second delay to avoid rate limiting
+    # Save combined result
+    combined_df = pd.json_normalize(all_stations)
+    combined_df.to_csv(combined_path, index=False)
+    return combined_df
 
-# Save combined result
-combined_df = pd.json_normalize(all_stations)
-combined_path = "data/raw/cv_county_stations_all.csv"
-combined_df.to_csv(combined_path, index=False)
 
-combined_path, combined_df[["id", "name", "county", "latitude", "longitude", "mindate", "maxdate"]].head(15)
\ No newline at end of file
+if __name__ == "__main__":
+    combined_df = collect_stations()
+    print(combined_df[["id", "name", "county", "latitude", "longitude", "mindate", "maxdate"]].head(15))
@@ -0,0 +1,126 @@
+import os
+import io
+import logging
+import numpy as np
+import mercantile
+import contextily as ctx
+import requests
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+
+from api_client import build_session, get_with_retry
+
+# ------------------ CONFIG ------------------
+TILE_CACHE_DIR = "data/raw/basemap_tiles"
+PROVIDER = ctx.providers.OpenStreetMap.Mapnik
+# Tiles are fetched at the highest zoom that covers the map in at most this many tiles
+MAX_TILES = 64
+MAX_WORKERS = 4
+# OSM's tile policy asks for an identifying User-Agent
+USER_AGENT = "central-valley-crop-climate/1.0"
+# Set BASEMAP_OFFLINE=1 to render from cached tiles only (pipeline.py --offline does this)
+OFFLINE = os.getenv("BASEMAP_OFFLINE") == "1"
+
+
+# ------------------ TILE CACHE ------------------
+def tile_path(tile, provider=PROVIDER, cache_dir=None):
+    cache_dir = cache_dir or TILE_CACHE_DIR
+    return os.path.join(cache_dir, provider.name, str(tile.z), str(tile.x), f"{tile.y}.png")
+
+
+def choose_zoom(west, south, east, north, max_tiles=MAX_TILES, max_zoom=None):
+    """Highest zoom level at which the lon/lat box fits in `max_tiles` tiles."""
+    max_zoom = max_zoom if max_zoom is not None else 18
+    for zoom in range(max_zoom, -1, -1):
+        upper_left = mercantile.tile(west, north, zoom)
+        lower_right = mercantile.tile(east, south, zoom)
+        if (lower_right.x - upper_left.x + 1) * (lower_right.y - upper_left.y + 1) <= max_tiles:
+            return zoom
+    return 0
+
+
+def _fetch_tile(session, tile, provider, cache_dir):
+    path = tile_path(tile, provider, cache_dir)
+    try:
+        response = get_with_retry(session, provider.build_url(x=tile.x, y=tile.y, z=tile.z), max_retries=3)
+    except requests.exceptions.RequestException as e:
+        logging.warning(f"Could not fetch tile {tile}: {e}")
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(response.content)
+    os.replace(tmp_path, path)
+    return True
+
+
+def ensure_tiles(tiles, provider=PROVIDER, offline=None, cache_dir=None, max_workers=MAX_WORKERS):
+    """Download any tiles missing from the cache (unless offline) and return those still missing."""
+    offline = OFFLINE if offline is None else offline
+    missing = [t for t in tiles if not os.path.exists(tile_path(t, provider, cache_dir))]
+    if not missing or offline:
+        return missing
+
+    logging.info(f"Fetching {len(missing)} basemap tile(s) from {provider.name}")
+    session = build_session(pool_size=max_workers, headers={"User-Agent": USER_AGENT})
+    # Probe with one tile first so an unreachable server costs one retry cycle, not one per tile
+    if not _fetch_tile(session, missing[0], provider, cache_dir):
+        return missing
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fetched = list(pool.map(lambda t: _fetch_tile(session, t, provider, cache_dir), missing[1:]))
+    return [t for t, ok in zip(missing[1:], fetched) if not ok]
+
+
+# ------------------ MOSAIC ------------------
+def mosaic(tiles, provider=PROVIDER, cache_dir=None):
+    """Stitch cached tiles into one RGBA array and its Web Mercator extent (left, right, bottom, top).
+
+    Tiles absent from the cache are left transparent.
+    """
+    xs = sorted({t.x for t in tiles})
+    ys = sorted({t.y for t in tiles})
+    zoom = tiles[0].z
+    size = 256
+    image = np.zeros((len(ys) * size, len(xs) * size, 4), dtype=np.uint8)
+
+    for tile in tiles:
+        path = tile_path(tile, provider, cache_dir)
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            img = Image.open(io.BytesIO(f.read())).convert("RGBA")
+        if img.size != (size, size):
+            img = img.resize((size, size))
+        row, col = (tile.y - ys[0]) * size, (tile.x - xs[0]) * size
+        image[row:row + size, col:col + size] = np.asarray(img)
+
+    upper_left = mercantile.xy_bounds(mercantile.Tile(xs[0], ys[0], zoom))
+    lower_right = mercantile.xy_bounds(mercantile.Tile(xs[-1], ys[-1], zoom))
+    return image, (upper_left.left, lower_right.right, lower_right.bottom, upper_left.top)
+
+
+# ------------------ PLOTTING ------------------
+def add_basemap(ax, provider=PROVIDER, alpha=1.0, offline=None, max_tiles=MAX_TILES, cache_dir=None):
+    """Draw cached basemap tiles under everything on an axis whose data is in EPSG:3857.
+
+    Missing tiles are downloaded into the local cache first, unless running
+    offline, in which case only what is already cached is drawn.
+    """
+    xmin, xmax = ax.get_xlim()
+    ymin, ymax = ax.get_ylim()
+    west, south = mercantile.lnglat(xmin, ymin)
+    east, north = mercantile.lnglat(xmax, ymax)
+
+    zoom = choose_zoom(west, south, east, north, max_tiles, provider.get("max_zoom"))
+    tiles = list(mercantile.tiles(west, south, east, north, zoom))
+    missing = ensure_tiles(tiles, provider, offline, cache_dir)
+    if len(missing) == len(tiles):
+        logging.warning(f"No cached basemap tiles for zoom {zoom}; drawing without a basemap")
+        return
+    if missing:
+        logging.warning(f"{len(missing)} of {len(tiles)} basemap tile(s) not cached; leaving them blank")
+
+    image, extent = mosaic(tiles, provider, cache_dir)
+    ax.imshow(image, extent=extent, alpha=alpha, zorder=0, interpolation="bilinear")
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
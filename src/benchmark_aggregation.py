@@ -0,0 +1,90 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+
+import climate_store
+import feature_engineering
+import synthetic_data
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ REFERENCE ------------------
+def summarize_annual_climate_per_file(input_dir, years):
+    """The original county x year loop with one read_csv per file, kept as the benchmark baseline."""
+    summary_rows = []
+    for county_dir in sorted(os.listdir(input_dir)):
+        county = county_dir
+        for year in years:
+            file_path = os.path.join(input_dir, county_dir, f"{county}_{year}.csv")
+            if not os.path.exists(file_path):
+                summary_rows.append({"county": county, "year": year,
+                                     "tmax_mean": np.nan, "tmin_mean": np.nan, "prcp_total": np.nan})
+                continue
+            df = pd.read_csv(file_path)
+            summary_rows.append({
+                "county": county,
+                "year": year,
+                "tmax_mean": df["TMAX"].mean() if "TMAX" in df.columns else np.nan,
+                "tmin_mean": df["TMIN"].mean() if "TMIN" in df.columns else np.nan,
+                "prcp_total": df["PRCP"].sum() if "PRCP" in df.columns else np.nan
+            })
+    return pd.DataFrame(summary_rows)
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# ------------------ MAIN ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark daily-to-annual climate aggregation.")
+    parser.add_argument("--counties", type=int, default=100)
+    parser.add_argument("--years", type=int, default=50)
+    args = parser.parse_args()
+
+    years = list(range(2024 - args.years + 1, 2025))
+    workdir = tempfile.mkdtemp(prefix="cv_bench_")
+    csv_root = os.path.join(workdir, "climate_noaa")
+    store_root = os.path.join(workdir, "climate_noaa_parquet")
+    try:
+        daily = synthetic_data.make_daily_climate(args.counties, years)
+        synthetic_data.write_csv_tree(daily, csv_root)
+        logging.info(f"Generated {len(daily):,} daily rows for {args.counties} counties x {args.years} years")
+
+        _, migrate_s = _timed(climate_store.migrate_csv_tree, csv_root, store_root)
+
+        feature_engineering.INPUT_DIR = os.path.join(workdir, "no_legacy_csv")
+        feature_engineering.YEARS = years
+        climate_store.STORE_ROOT = store_root
+
+        baseline, baseline_s = _timed(summarize_annual_climate_per_file, csv_root, years)
+        (grouped, _), grouped_s = _timed(feature_engineering.summarize_annual_climate)
+        (chunked, _), chunked_s = _timed(feature_engineering.summarize_annual_climate, chunked=True, batch_size=200_000)
+
+        key = ["county", "year"]
+        for result in (grouped, chunked):
+            pd.testing.assert_frame_equal(
+                baseline.sort_values(key).reset_index(drop=True),
+                result.astype({"county": object, "year": int}).sort_values(key).reset_index(drop=True),
+                check_dtype=False,
+            )
+
+        logging.info(f"One-time CSV → Parquet migration: {migrate_s:.2f}s")
+        logging.info(f"Per-file CSV loop:                 {baseline_s:.2f}s")
+        logging.info(f"Grouped Parquet reduction:         {grouped_s:.2f}s ({baseline_s / grouped_s:.1f}x)")
+        logging.info(f"Chunked Parquet reduction:         {chunked_s:.2f}s ({baseline_s / chunked_s:.1f}x)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+import pandas as pd
+
+import assign_stations
+import noaa_climate_collector
+import data_collection
+import climate_store
+from api_client import NOAA_REQUESTS_PER_SECOND
+from mock_api_server import MockAPIServer, MockConfig, NOAA_DATA_PATH, NOAA_STATIONS_PATH, USDA_PATH
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ COLLECTORS ------------------
+def _run_stations(server, workdir, client_rate):
+    assign_stations.BASE_URL = server.url + NOAA_STATIONS_PATH
+    return assign_stations.collect_stations(
+        output_dir=os.path.join(workdir, "county_station_batches"),
+        combined_path=os.path.join(workdir, "cv_county_stations_all.csv"),
+        delay=0,
+        requests_per_second=client_rate,
+    )
+
+
+def _run_noaa(server, workdir, station_map, n_years, workers, client_rate):
+    noaa_climate_collector.BASE_URL = server.url + NOAA_DATA_PATH
+    noaa_climate_collector.PAGE_CACHE_DIR = os.path.join(workdir, "_pages")
+    climate_store.STORE_ROOT = os.path.join(workdir, "climate_noaa_parquet")
+    end_year = noaa_climate_collector.END_YEAR
+    return noaa_climate_collector.collect_climate_data(
+        station_map, end_year - n_years + 1, end_year, max_workers=workers, requests_per_second=client_rate)
+
+
+def _run_usda(server, workdir, n_years, workers):
+    data_collection.BASE_URL = server.url + USDA_PATH
+    data_collection.CACHE_DIR = os.path.join(workdir, "usda_cache")
+    return data_collection.fetch_all_crop_data(2025 - n_years, 2024, max_workers=workers)
+
+
+def _measure(server, name, fn, *args):
+    """Run one collector and return its throughput summary alongside its output."""
+    server.reset_stats()
+    start = time.perf_counter()
+    output = fn(*args)
+    elapsed = time.perf_counter() - start
+    rows = output if isinstance(output, int) else len(output)
+    stats = server.stats.as_dict()
+    result = {
+        "seconds": round(elapsed, 3),
+        "rows": rows,
+        "requests": stats["requests"],
+        "requests_per_second": round(stats["requests"] / elapsed, 2) if elapsed else None,
+        "rate_limited": stats["rate_limited"],
+        "server_errors": stats["errors"],
+    }
+    logging.info(f"{name}: {elapsed:.2f}s, {stats['requests']} requests ({result['requests_per_second']}/s), "
+                 f"{stats['rate_limited']} × 429, {stats['errors']} × 5xx, {rows} rows")
+    return result, output
+
+
+# ------------------ BENCHMARK ------------------
+def run_benchmark(config, worker_counts=(1, 4, 8), n_years=3, client_rate=None):
+    """Drive all three collectors against a fresh mock server once per worker count.
+
+    `client_rate` overrides the NOAA client-side limit of both NOAA collectors for this run only.
+    """
+    client_rate = client_rate or NOAA_REQUESTS_PER_SECOND
+
+    results = []
+    with MockAPIServer(config) as server:
+        logging.info(f"Mock API at {server.url} (latency {config.latency}s, rate {config.rate or '∞'}/s)")
+        for workers in worker_counts:
+            workdir = tempfile.mkdtemp(prefix="cv_collectors_")
+            try:
+                run = {"workers": workers}
+                run["assign_stations"], stations = _measure(server, "assign_stations", _run_stations, server, workdir,
+                                                          client_rate)
+                # One station per county, as in the validated station map
+                station_map = (stations.groupby("county", as_index=False).first()
+                               .rename(columns={"id": "station_id"})[["county", "station_id"]])
+                run["noaa_climate_collector"], _ = _measure(server, f"noaa_climate_collector[{workers}]",
+                                                            _run_noaa, server, workdir, station_map, n_years, workers,
+                                                            client_rate)
+                run["data_collection"], _ = _measure(server, f"data_collection[{workers}]",
+                                                     _run_usda, server, workdir, n_years, workers)
+                results.append(run)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Measure collector throughput against a local NOAA/USDA mock.")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 4, 8])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of server latency per request")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate", type=float, default=5.0, help="Server requests/second before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--client-rate", type=float, help="Override the collectors' NOAA client-side rate limit")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, rate=args.rate, error_rate=args.error_rate)
+    results = run_benchmark(config, args.workers, args.years, args.client_rate)
+
+    summary = pd.DataFrame([
+        {"workers": run["workers"], "collector": name, **run[name]}
+        for run in results for name in ("noaa_climate_collector", "data_collection")
+    ])
+    print(summary.to_string(index=False))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(config), "runs": results}, f, indent=2)
+        logging.info(f"✔ Saved collector benchmark to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
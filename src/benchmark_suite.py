@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import datetime
+import subprocess
+import logging
+import pandas as pd
+
+import climate_store
+import instrumentation
+import crop_data
+import feature_engineering
+import build_crop_specific_datasets as builder
+import model_registry
+import model_crop_yield
+import yield_loss_hot_years
+import combined_hot_year_impact_map
+import hot_years_impact
+import synthetic_data
+
+# ------------------ CONFIG ------------------
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(os.path.dirname(SRC_DIR), "results", "benchmarks")
+STAGES = ["summarize_annual_climate", "impute_climate_data", "load_usda",
+          "build_crop_datasets", "model_yield_per_crop", "hot_year_analyses"]
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ INPUTS ------------------
+def generate_inputs(n_counties, n_years, n_crops, seed):
+    """Write synthetic NOAA daily and USDA QuickStats inputs under the current directory's data/ tree."""
+    years = list(range(2024 - n_years + 1, 2025))
+    daily = synthetic_data.make_daily_climate(n_counties, years, seed)
+    synthetic_data.write_parquet_store(daily, climate_store.STORE_ROOT)
+
+    climate = synthetic_data.annual_climate(daily)
+    usda = synthetic_data.make_usda_table(climate, n_crops, seed)
+    os.makedirs(os.path.dirname(builder.USDA_FILE), exist_ok=True)
+    usda.to_csv(builder.USDA_FILE, index=False)
+
+    logging.info(f"Generated {len(daily):,} daily rows and {len(usda):,} USDA rows "
+                 f"({n_counties} counties x {n_years} years x {n_crops} crops)")
+    return {"years": years, "climate": climate, "daily_rows": len(daily), "usda_rows": len(usda),
+            "n_crops": n_crops, "seed": seed}
+
+
+# ------------------ STAGES ------------------
+# Each stage takes the shared context, stores anything later stages need in it, and returns a row count
+
+def _stage_summarize(ctx):
+    feature_engineering.INPUT_DIR = "no_legacy_csv"
+    feature_engineering.YEARS = ctx["years"]
+    annual, _ = feature_engineering.summarize_annual_climate()
+    ctx["annual"] = annual
+    return len(annual)
+
+
+def _stage_impute(ctx):
+    annual = ctx.get("annual", ctx["climate"])
+    imputed = feature_engineering.impute_climate_data(annual)
+    os.makedirs(feature_engineering.OUTPUT_DIR, exist_ok=True)
+    imputed.to_csv(feature_engineering.OUTPUT_FILE, index=False)
+    return len(imputed)
+
+
+def _stage_load_usda(ctx):
+    # Measure the cold CSV ingest, not a cache hit
+    if os.path.exists(builder.USDA_CACHE):
+        os.remove(builder.USDA_CACHE)
+    ctx["usda"] = builder.load_usda()
+    return len(ctx["usda"])
+
+
+def _stage_build(ctx):
+    if not os.path.exists(feature_engineering.OUTPUT_FILE):
+        os.makedirs(feature_engineering.OUTPUT_DIR, exist_ok=True)
+        ctx["climate"].to_csv(feature_engineering.OUTPUT_FILE, index=False)
+    usda = ctx["usda"] if "usda" in ctx else builder.load_usda()
+    builder.build_crop_datasets(usda, builder.load_climate())
+    return sum(1 for f in os.listdir(builder.OUTPUT_DIR) if f.endswith(".csv"))
+
+
+def _ensure_crop_datasets(ctx):
+    if not os.path.isdir(crop_data.CROP_DIR) or not crop_data.list_crops():
+        crops = synthetic_data.make_crop_datasets(ctx["climate"], ctx["n_crops"], ctx["seed"])
+        synthetic_data.write_crop_datasets(crops, crop_data.CROP_DIR)
+
+
+def _stage_model(ctx):
+    _ensure_crop_datasets(ctx)
+    # Train from scratch every time instead of loading registered models
+    shutil.rmtree(model_registry.REGISTRY_DIR, ignore_errors=True)
+    os.makedirs(model_crop_yield.OUTPUT_DIR, exist_ok=True)
+    return len(model_crop_yield.model_yield_per_crop(max_workers=ctx.get("workers")))
+
+
+def _stage_hot_years(ctx):
+    _ensure_crop_datasets(ctx)
+    crop_data.clear_cache()
+    crops = crop_data.load_all_crops()
+    os.makedirs(os.path.dirname(yield_loss_hot_years.OUTPUT_FILE), exist_ok=True)
+    yield_loss_hot_years.compute_yield_loss(crops)
+    combined_hot_year_impact_map.compute_county_deltas(crops)
+    return len(hot_years_impact.compute_crop_county_deltas(crops))
+
+
+STAGE_FUNCTIONS = {
+    "summarize_annual_climate": _stage_summarize,
+    "impute_climate_data": _stage_impute,
+    "load_usda": _stage_load_usda,
+    "build_crop_datasets": _stage_build,
+    "model_yield_per_crop": _stage_model,
+    "hot_year_analyses": _stage_hot_years,
+}
+
+
+# ------------------ RUNNER ------------------
+def run_stage(name, ctx, repeat=1):
+    """Best-of-`repeat` wall and CPU time, and the highest peak RSS across the runs."""
+    timings, peaks = [], []
+    for _ in range(repeat):
+        cpu_start, start = time.process_time(), time.perf_counter()
+        # A span rather than a bare high-water-mark reset, so spans inside the stage don't hide its peak
+        with instrumentation.span(name, "benchmark") as current:
+            rows = STAGE_FUNCTIONS[name](ctx)
+        timings.append((time.perf_counter() - start, time.process_time() - cpu_start))
+        peaks.append(current.peak)
+    wall, cpu = min(timings)
+    result = {
+        "seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "all_seconds": [round(t, 4) for t, _ in timings],
+        "peak_rss_mb": round(max(peaks), 1),
+        "children_peak_rss_mb": round(instrumentation.children_peak_rss_mb(), 1),
+        "rows": rows,
+    }
+    logging.info(f"{name}: {wall:.2f}s wall, {cpu:.2f}s CPU, peak RSS {result['peak_rss_mb']:.0f} MB, {rows:,} rows")
+    return result
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(stages=STAGES, n_counties=15, n_years=15, n_crops=10, seed=synthetic_data.DEFAULT_SEED,
+              repeat=1, workers=None, keep=False):
+    """Run the selected stages on synthetic data in a scratch directory and return the JSON report."""
+    workdir = tempfile.mkdtemp(prefix="cv_bench_suite_")
+    original_cwd = os.getcwd()
+    # Scripts use paths relative to the project root, so the run stays out of the real data/
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        ctx = generate_inputs(n_counties, n_years, n_crops, seed)
+        ctx["workers"] = workers
+        generate_s = time.perf_counter() - start
+
+        results = {name: run_stage(name, ctx, repeat) for name in STAGES if name in stages}
+    finally:
+        os.chdir(original_cwd)
+        if keep:
+            logging.info(f"Kept benchmark workspace at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": {"counties": n_counties, "years": n_years, "crops": n_crops, "seed": seed,
+                  "daily_rows": ctx["daily_rows"], "usda_rows": ctx["usda_rows"]},
+        "generate_seconds": round(generate_s, 4),
+        "stages": results,
+    }
+
+
+def compare(report, baseline):
+    """Log each stage's time against a previous report."""
+    if baseline.get("scale") != report["scale"]:
+        logging.warning(f"Comparing different scales: {baseline.get('scale')} vs {report['scale']}")
+    for name, result in report["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous:
+            continue
+        ratio = previous["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        logging.info(f"{name}: {previous['seconds']:.2f}s → {result['seconds']:.2f}s ({ratio:.2f}x), "
+                     f"peak RSS {previous['peak_rss_mb']:.0f} → {result['peak_rss_mb']:.0f} MB")
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile pipeline stages on synthetic data.")
+    parser.add_argument("--counties", type=int, default=15)
+    parser.add_argument("--years", type=int, default=15)
+    parser.add_argument("--crops", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=synthetic_data.DEFAULT_SEED)
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is reported")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for model training")
+    parser.add_argument("--output", help="JSON report path (default: results/benchmarks/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch workspace for inspection")
+    args = parser.parse_args()
+
+    report = run_suite(args.stages, args.counties, args.years, args.crops, args.seed,
+                       args.repeat, args.workers, args.keep)
+
+    output = args.output
+    if not output:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}_{report['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"✔ Benchmark report saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
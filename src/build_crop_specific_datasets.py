@@ -1,30 +1,91 @@
 import os
+import argparse
+import numpy as np
 import pandas as pd
 import logging
+from pandas.api.types import union_categoricals
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
 
 # ------------------ CONFIG ------------------
 USDA_FILE = "data/raw/usda_central_valley_all_ag_data_2010_2024.csv"
 CLIMATE_FILE = "data/processed/climate_features_2010_2024.csv"
 OUTPUT_DIR = "data/processed/by_crop"
+# "csv" keeps the <crop>.csv files every analysis script reads; "parquet" or "both" add <crop>.parquet
+OUTPUT_FORMAT = "csv"
+MAX_WORKERS = 8
 
 # ------------------ LOGGING ------------------
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 # ------------------ LOAD & CLEAN USDA ------------------
-def load_usda():
-    logging.info(f"Reading USDA data from: {USDA_FILE}")
-    df = pd.read_csv(USDA_FILE)
-    df.columns = df.columns.str.lower().str.strip()
-
-    df["year"] = df["year"].astype(int)
-    df["county"] = df["county"].str.strip().str.upper().str.replace(" ", "_")
-    df["commodity"] = df["commodity"].str.upper().str.strip()
-    df["statistic"] = df["statistic"].str.upper().str.strip()
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")  # <-- FIXED
-    logging.info(f"Loaded USDA rows: {len(df)}")
+# Only the columns the builder uses are parsed; text columns become categoricals
+USDA_DTYPES = {"year": "int16", "county": "category", "commodity": "category",
+               "statistic": "category", "value": "string"}
+CATEGORY_COLUMNS = ["county", "commodity", "statistic"]
+USDA_CHUNK_SIZE = 250_000
+USDA_CACHE = "data/processed/usda_central_valley_all_ag_data_2010_2024.parquet"
+
+
+def _normalize_categories(series, normalize):
+    """Apply a string normalization to a categorical's categories only, merging any that collide."""
+    codes, uniques = pd.factorize(series)
+    new_codes, categories = pd.factorize(normalize(pd.Series(uniques, dtype=object)))
+    return pd.Categorical.from_codes(np.where(codes >= 0, new_codes[codes], -1), categories=categories)
+
+
+def _clean_usda_chunk(chunk):
+    chunk["county"] = _normalize_categories(chunk["county"], lambda s: s.str.strip().str.upper().str.replace(" ", "_"))
+    chunk["commodity"] = _normalize_categories(chunk["commodity"], lambda s: s.str.upper().str.strip())
+    chunk["statistic"] = _normalize_categories(chunk["statistic"], lambda s: s.str.upper().str.strip())
+    chunk["value"] = pd.to_numeric(chunk["value"], errors="coerce")
+    return chunk
+
+
+def read_usda_csv(path=None, chunksize=USDA_CHUNK_SIZE):
+    """Stream the raw USDA CSV in chunks with explicit dtypes, normalizing each chunk as it arrives."""
+    path = path or USDA_FILE
+    header = pd.read_csv(path, nrows=0).columns
+    # Raw headers may differ in case/whitespace from the names used here
+    raw_names = {col: col.lower().strip() for col in header if col.lower().strip() in USDA_DTYPES}
+    dtypes = {raw: USDA_DTYPES[name] for raw, name in raw_names.items()}
+
+    chunks = []
+    reader = pd.read_csv(path, usecols=list(raw_names), dtype=dtypes, chunksize=chunksize)
+    for chunk in reader:
+        chunks.append(_clean_usda_chunk(chunk.rename(columns=raw_names)))
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in USDA_DTYPES.items()})
+
+    # Chunks see different category sets; union them (sorted, so pivots order columns alphabetically as before)
+    combined = {col: union_categoricals([c[col] for c in chunks], sort_categories=True) for col in CATEGORY_COLUMNS}
+    df = pd.concat([c.drop(columns=CATEGORY_COLUMNS) for c in chunks], ignore_index=True)
+    for col in CATEGORY_COLUMNS:
+        df[col] = combined[col]
+    return df[list(USDA_DTYPES)]
+
+
+@instrumentation.traced("io", rows=len)
+def load_usda(path=None, cache_path=None, chunksize=USDA_CHUNK_SIZE):
+    """Compact USDA table, parsed once from CSV and then served from a Parquet cache until the CSV changes."""
+    path = path or USDA_FILE
+    cache_path = cache_path or USDA_CACHE
+    if os.path.exists(cache_path) and os.stat(cache_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+        logging.info(f"Reading cached USDA data from: {cache_path}")
+        df = pd.read_parquet(cache_path)
+    else:
+        logging.info(f"Reading USDA data from: {path}")
+        df = read_usda_csv(path, chunksize)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    logging.info(f"Loaded USDA rows: {len(df)} ({df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
     return df
 
 # ------------------ LOAD CLIMATE ------------------
+@instrumentation.traced("io", rows=len)
 def load_climate():
     logging.info(f"Reading climate data from: {CLIMATE_FILE}")
     df = pd.read_csv(CLIMATE_FILE)
@@ -33,37 +94,60 @@ def load_climate():
     return df
 
 # ------------------ MAIN ROUTINE ------------------
-def build_crop_datasets(usda_df, climate_df):
+def crop_file_stem(crop):
+    return crop.lower().replace(',', '').replace(' ', '_')
+
+
+def _write_crop(crop, df, output_format):
+    stem = os.path.join(OUTPUT_DIR, crop_file_stem(crop))
+    if output_format in ("csv", "both"):
+        df.to_csv(stem + ".csv", index=False)
+    if output_format in ("parquet", "both"):
+        df.to_parquet(stem + ".parquet", index=False)
+    logging.info(f"✔ Saved {stem} with {len(df)} rows")
+    return crop, len(df)
+
+
+def build_crop_datasets(usda_df, climate_df, output_format=OUTPUT_FORMAT, max_workers=MAX_WORKERS):
+    """Pivot every commodity in one pass, merge once with climate, then write one file per crop."""
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     crop_list = usda_df["commodity"].unique()
     logging.info(f"Detected {len(crop_list)} crops")
 
-    for crop in crop_list:
-        logging.info(f"Processing: {crop}")
-        df_crop = usda_df[usda_df["commodity"] == crop].copy()
-        if df_crop.empty:
-            logging.warning(f"No data for {crop}")
-            continue
+    wide = usda_df.pivot_table(
+        index=["county", "year", "commodity"],
+        columns="statistic",
+        values="value",
+        observed=True
+    )
+    wide.columns = [col.lower().replace(" ", "").replace("/", "_per") for col in wide.columns]
+    stat_cols = list(wide.columns)
+    wide = wide.reset_index()
 
-        df_pivot = df_crop.pivot_table(
-            index=["county", "year"],
-            columns="statistic",
-            values="value"
-        ).reset_index()
+    merged = pd.merge(climate_df, wide, on=["county", "year"], how="inner")
+    climate_cols = list(climate_df.columns)
 
-        df_pivot.columns = [col.lower().replace(" ", "").replace("/", "_per") for col in df_pivot.columns]
-        df_pivot["commodity"] = crop
+    jobs = []
+    for crop, df_crop in merged.groupby("commodity", sort=False, observed=True):
+        # Keep only the statistics this crop actually reports, as the per-crop pivot used to
+        crop_stats = [col for col in stat_cols if df_crop[col].notna().any()]
+        jobs.append((crop, df_crop[climate_cols + crop_stats + ["commodity"]]))
 
-        merged = pd.merge(climate_df, df_pivot, on=["county", "year"], how="inner")
-        output_file = os.path.join(OUTPUT_DIR, f"{crop.lower().replace(',', '').replace(' ', '_')}.csv")
-        merged.to_csv(output_file, index=False)
-        logging.info(f"✔ Saved {output_file} with {len(merged)} rows")
+    for crop in set(crop_list) - {crop for crop, _ in jobs}:
+        logging.warning(f"No county-years overlap with climate data for {crop}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda job: _write_crop(*job, output_format), jobs))
 
 def main():
+    parser = argparse.ArgumentParser(description="Build one merged climate + USDA dataset per crop.")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default=OUTPUT_FORMAT)
+    args = parser.parse_args()
+
     logging.info("🚀 Starting crop-specific dataset builder...")
     usda = load_usda()
     climate = load_climate()
-    build_crop_datasets(usda, climate)
+    build_crop_datasets(usda, climate, output_format=args.format)
     logging.info("🎉 Done creating per-crop datasets.")
 
 # ------------------ ENTRY ------------------
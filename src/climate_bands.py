@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# ------------------ CONFIG ------------------
+YIELD_COL = "yield"
+TEMP_COL = "tmax_mean"
+BAND_COL = "climate_band"
+ROLLING_WINDOW = 10
+
+
+# ------------------ THRESHOLDS ------------------
+def _group_thresholds(df, by, temp_col):
+    """Mean/std of temp broadcast back to each row, over the whole frame or within `by` groups."""
+    if not by:
+        return (np.full(len(df), df[temp_col].mean()), np.full(len(df), df[temp_col].std()))
+    grouped = df.groupby(by, observed=True)[temp_col]
+    return grouped.transform("mean").to_numpy(), grouped.transform("std").to_numpy()
+
+
+def _rolling_thresholds(df, by, temp_col, window):
+    """Mean/std of all rows from the `window` years up to and including each row's year, within `by` groups.
+
+    Per group-year sums, sums of squares and counts are laid out on a dense
+    group x year grid, and windowed totals come from cumulative-sum differences.
+    """
+    temp = df[temp_col].astype(float)
+    group_cols = by or ["_all"]
+    frame = pd.DataFrame({"s": temp.fillna(0), "ss": (temp ** 2).fillna(0), "n": temp.notna().astype(float)})
+    for col in by:
+        frame[col] = df[col]
+    if not by:
+        frame["_all"] = 0
+    frame["year"] = df["year"]
+    yearly = frame.groupby(group_cols + ["year"], observed=True)[["s", "ss", "n"]].sum()
+
+    year_levels = yearly.index.get_level_values("year")
+    years = np.arange(year_levels.min(), year_levels.max() + 1)
+    wide = yearly.unstack("year", fill_value=0)
+
+    rolled = {}
+    for stat in ("s", "ss", "n"):
+        cumulative = np.cumsum(wide[stat].reindex(columns=years, fill_value=0).to_numpy(), axis=1)
+        lagged = np.zeros_like(cumulative)
+        lagged[:, window:] = cumulative[:, :-window]
+        rolled[stat] = (cumulative - lagged).ravel()
+
+    n = rolled["n"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = rolled["s"] / n
+        var = (rolled["ss"] - n * mean ** 2) / (n - 1)
+    std = np.where(n > 1, np.sqrt(np.clip(var, 0, None)), np.nan)
+
+    group_index = wide.index.to_frame(index=False)
+    grid = group_index.loc[group_index.index.repeat(len(years))].reset_index(drop=True)
+    grid["year"] = np.tile(years, len(group_index))
+    grid["mean"] = np.where(n > 1, mean, np.nan)
+    grid["std"] = std
+
+    aligned = frame[group_cols + ["year"]].merge(grid, on=group_cols + ["year"], how="left")
+    return aligned["mean"].to_numpy(), aligned["std"].to_numpy()
+
+
+# ------------------ KERNEL ------------------
+def classify(temps, mean, std, include_cool=True):
+    """hot / normal / cool labels from elementwise comparisons against mean ± std."""
+    temps = np.asarray(temps, dtype=float)
+    conditions = [temps > mean + std]
+    choices = ["hot"]
+    if include_cool:
+        conditions.append(temps < mean - std)
+        choices.append("cool")
+    return np.select(conditions, choices, default="normal")
+
+
+def tag_bands(df, by=None, baseline="static", window=ROLLING_WINDOW, include_cool=True,
+              temp_col=TEMP_COL, band_col=BAND_COL):
+    """Return a copy of `df` with a climate band per row.
+
+    Thresholds are mean ± one std of `temp_col`, computed over the whole frame
+    (`by=None`), within groups such as `["crop"]` or `["crop", "county"]`, and
+    either over all years (`baseline="static"`) or over the trailing `window`
+    years (`baseline="rolling"`).
+    """
+    by = [by] if isinstance(by, str) else list(by or [])
+    if baseline == "rolling":
+        mean, std = _rolling_thresholds(df, by, temp_col, window)
+    elif baseline == "static":
+        mean, std = _group_thresholds(df, by, temp_col)
+    else:
+        raise ValueError(f"Unknown baseline {baseline!r}; expected 'static' or 'rolling'")
+    out = df.copy()
+    out[band_col] = classify(df[temp_col].to_numpy(), mean, std, include_cool)
+    return out
+
+
+# ------------------ SUMMARIES ------------------
+def band_summary(df, by=None, yield_col=YIELD_COL, band_col=BAND_COL):
+    """count/mean/std of yield per band, for every group in one grouped pass."""
+    keys = list([by] if isinstance(by, str) else (by or [])) + [band_col]
+    return df.groupby(keys, observed=True)[yield_col].agg(["count", "mean", "std"]).reset_index()
+
+
+def hot_vs_normal(df, by=None, yield_col=YIELD_COL, band_col=BAND_COL):
+    """Normal and hot mean yield, their difference, % change and hot-row count per group."""
+    by = [by] if isinstance(by, str) else list(by or [])
+    keys = by or ["_all"]
+    if not by:
+        df = df.assign(_all=0)
+    stats = band_summary(df, keys, yield_col, band_col).set_index(keys + [band_col]).unstack(band_col)
+    hot = stats.get(("mean", "hot"), pd.Series(np.nan, index=stats.index))
+    normal = stats.get(("mean", "normal"), pd.Series(np.nan, index=stats.index))
+    n_hot = stats.get(("count", "hot"), pd.Series(0, index=stats.index)).fillna(0).astype(int)
+
+    delta = hot - normal
+    out = pd.DataFrame({
+        "normal_yield": normal,
+        "hot_yield": hot,
+        "yield_change": delta,
+        "percent_change": 100 * delta / normal.where(normal != 0),
+        "hot_years": n_hot,
+    })
+    return out.reset_index() if by else out.reset_index(drop=True)
+
+
+def stack_crops(crops):
+    """One long frame with a `crop` column, so per-crop statistics become a single grouped pass."""
+    frames = [df.assign(crop=crop) for crop, df in crops]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
@@ -1,12 +1,15 @@
 import os
+import argparse
 import pandas as pd
-import numpy as np
 import logging
-import statsmodels.api as sm
+
+import crop_data
+import climate_bands
+import sensitivity_engine
 
 # ------------------ CONFIG ------------------
-INPUT_DIR = "data/processed/by_crop"
 OUTPUT_FILE = "results/climate_trends/crop_sensitivity_summary.csv"
+DETAIL_FILE = "results/climate_trends/crop_county_sensitivity.csv"
 YIELD_COL = "yield"
 TEMP_COL = "tmax_mean"
 
@@ -14,29 +17,44 @@ TEMP_COL = "tmax_mean"
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 # ------------------ MAIN ------------------
-results = []
-
-for file in os.listdir(INPUT_DIR):
-    if not file.endswith(".csv"):
-        continue
-    crop = file.replace(".csv", "")
-    df = pd.read_csv(os.path.join(INPUT_DIR, file))
-    df = df.dropna(subset=[YIELD_COL, TEMP_COL])
-
-    if len(df) < 10:
-        continue
-
-    X = sm.add_constant(df[TEMP_COL])
-    y = df[YIELD_COL]
-    model = sm.OLS(y, X).fit()
-
-    results.append({
-        "crop": crop,
-        "slope_tmax": model.params[TEMP_COL],
-        "intercept": model.params["const"],
-        "r_squared": model.rsquared,
-        "n": len(df)
-    })
-
-pd.DataFrame(results).to_csv(OUTPUT_FILE, index=False)
-print(f"Saved climate sensitivity summary to {OUTPUT_FILE}")
\ No newline at end of file
+def compute_sensitivity(crops=None, multivariate=True):
+    stacked = climate_bands.stack_crops(crop_data.iter_analysis_crops(crops=crops))
+    if stacked.empty:
+        logging.warning("No crops with enough data for sensitivity fits.")
+        return
+
+    # Crop-level tmax slope, same table the single-crop statsmodels fits used to produce
+    per_crop = sensitivity_engine.batched_ols(stacked, ["crop"], [TEMP_COL], YIELD_COL)
+    results = per_crop.rename(columns={"coef": "slope_tmax"})[["crop", "slope_tmax", "intercept", "r_squared", "n"]]
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    results.to_csv(OUTPUT_FILE, index=False)
+    print(f"Saved climate sensitivity summary to {OUTPUT_FILE}")
+
+    # Every crop x county x climate variable, plus joint fits on all three variables
+    detail = pd.concat([
+        sensitivity_engine.sensitivity_table(stacked, ["crop"], multivariate=multivariate).assign(county="ALL"),
+        sensitivity_engine.sensitivity_table(stacked, ["crop", "county"], multivariate=multivariate),
+    ], ignore_index=True)
+    detail = detail[["crop", "county"] + [c for c in detail.columns if c not in ("crop", "county")]]
+    detail.to_csv(DETAIL_FILE, index=False)
+    print(f"Saved per-county sensitivity table ({len(detail)} rows) to {DETAIL_FILE}")
+
+def print_diagnostics(crop, county=None, crops=None):
+    """Full statsmodels summary for one crop (optionally one county) on all climate variables."""
+    df = crop_data.analysis_frame(crop_data.load_crop(crop) if crops is None else crops[crop])
+    if df is None:
+        logging.warning(f"{crop}: Not enough data.")
+        return
+    if county:
+        df = df[df["county"] == county]
+    print(sensitivity_engine.detailed_fit(df, sensitivity_engine.CLIMATE_VARS, YIELD_COL).summary())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Yield sensitivity to climate per crop and county.")
+    parser.add_argument("--diagnostics", metavar="CROP", help="Print a full statsmodels summary for this crop instead")
+    parser.add_argument("--county", help="Restrict --diagnostics to one county")
+    args = parser.parse_args()
+    if args.diagnostics:
+        print_diagnostics(args.diagnostics, args.county)
+    else:
+        compute_sensitivity()
@@ -0,0 +1,141 @@
+import os
+import logging
+from glob import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import instrumentation
+
+# ------------------ CONFIG ------------------
+CSV_ROOT = "data/raw/climate_noaa"
+STORE_ROOT = "data/raw/climate_noaa_parquet"
+VALUE_COLUMNS = ["TMAX", "TMIN", "PRCP"]
+
+# county/year live in the directory names, not in the files
+PARTITIONING = ds.partitioning(pa.schema([("county", pa.string()), ("year", pa.int32())]), flavor="hive")
+FILE_SCHEMA = pa.schema(
+    [("date", pa.timestamp("s")), ("station", pa.string())] +
+    [(col, pa.float64()) for col in VALUE_COLUMNS]
+)
+DATASET_SCHEMA = pa.schema(list(FILE_SCHEMA) + list(PARTITIONING.schema))
+
+
+# ------------------ WRITE ------------------
+def partition_path(county, year, root=None):
+    root = root or STORE_ROOT
+    return os.path.join(root, f"county={county}", f"year={year}", "part-0.parquet")
+
+
+def has_partition(county, year, root=None):
+    root = root or STORE_ROOT
+    return os.path.exists(partition_path(county, year, root))
+
+
+def _to_table(df):
+    df = df.copy()
+    df["date"] = pd.to_datetime(df["date"])
+    if "station" not in df.columns:
+        df["station"] = None
+    for col in VALUE_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else float("nan")
+    return pa.Table.from_pandas(df[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False)
+
+
+def write_partition(df, county, year, root=None):
+    """Write one county-year of daily records, replacing any existing partition atomically."""
+    root = root or STORE_ROOT
+    path = partition_path(county, year, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Dot-prefixed so a crashed write is never picked up by the dataset scan
+    tmp_path = os.path.join(os.path.dirname(path), ".part-0.parquet.tmp")
+    pq.write_table(_to_table(df), tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def migrate_csv_tree(csv_root=CSV_ROOT, root=None):
+    """One-time copy of the legacy <county>/<county>_<year>.csv tree into the Parquet store."""
+    root = root or STORE_ROOT
+    migrated = 0
+    for file_path in sorted(glob(os.path.join(csv_root, "*", "*.csv"))):
+        county = os.path.basename(os.path.dirname(file_path))
+        stem = os.path.basename(file_path)[:-len(".csv")]
+        year_part = stem.rsplit("_", 1)[-1]
+        if not stem.startswith(county + "_") or not year_part.isdigit():
+            continue
+        year = int(year_part)
+        if has_partition(county, year, root):
+            continue
+        try:
+            write_partition(pd.read_csv(file_path), county, year, root)
+            migrated += 1
+        except Exception as e:
+            logging.error(f"Error migrating {file_path}: {e}")
+    if migrated:
+        logging.info(f"✔ Migrated {migrated} county-year files into {root}")
+    return migrated
+
+
+# ------------------ READ ------------------
+def open_dataset(root=None):
+    root = root or STORE_ROOT
+    return ds.dataset(root, format="parquet", partitioning=PARTITIONING, schema=DATASET_SCHEMA)
+
+
+def build_filter(counties=None, years=None):
+    """Partition filter expression; pyarrow prunes non-matching directories before opening any file."""
+    expr = None
+    if counties is not None:
+        expr = ds.field("county").isin(list(counties))
+    if years is not None:
+        year_expr = ds.field("year").isin([int(y) for y in years])
+        expr = year_expr if expr is None else expr & year_expr
+    return expr
+
+
+@instrumentation.traced("io", rows=len)
+def read_daily(columns=None, counties=None, years=None, root=None):
+    """Read daily records as one frame, reading only the requested columns and partitions."""
+    root = root or STORE_ROOT
+    if not os.path.isdir(root):
+        return pd.DataFrame(columns=columns or DATASET_SCHEMA.names)
+    table = open_dataset(root).to_table(columns=columns, filter=build_filter(counties, years))
+    return table.to_pandas()
+
+
+def iter_daily_batches(columns=None, counties=None, years=None, batch_size=1_000_000, root=None):
+    """Stream record batches for aggregations that should not hold the whole store in memory."""
+    root = root or STORE_ROOT
+    if not os.path.isdir(root):
+        return
+    scanner = open_dataset(root).scanner(columns=columns, filter=build_filter(counties, years), batch_size=batch_size)
+    # Each partition file yields its own small batch; coalesce them so callers see ~batch_size rows
+    pending, pending_rows = [], 0
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        if pending_rows >= batch_size:
+            yield pa.Table.from_batches(pending).to_pandas()
+            pending, pending_rows = [], 0
+    if pending:
+        yield pa.Table.from_batches(pending).to_pandas()
+
+
+def list_partitions(root=None):
+    """(county, year) pairs present in the store, read from the directory layout only."""
+    root = root or STORE_ROOT
+    parts = []
+    for path in glob(os.path.join(root, "county=*", "year=*", "part-0.parquet")):
+        year_dir = os.path.dirname(path)
+        county = os.path.basename(os.path.dirname(year_dir)).split("=", 1)[1]
+        parts.append((county, int(os.path.basename(year_dir).split("=", 1)[1])))
+    return sorted(parts)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    migrate_csv_tree()
@@ -1,30 +1,31 @@
 import os
-import re
+import argparse
 import pandas as pd
 
-INPUT_DIR = "results/yield_models"
+import metrics_store
+
 OUTPUT_FILE = "results/model_results.csv"
 
-rows = []
-for file in os.listdir(INPUT_DIR):
-    if not file.endswith("_metrics.txt"):
-        continue
-    crop = file.replace("_metrics.txt", "")
-    path = os.path.join(INPUT_DIR, file)
-
-    with open(path, "r") as f:
-        content = f.read()
-        r2_match = re.search(r"R²:\s*([0-9\.\-]+)", content)
-        mae_match = re.search(r"MAE:\s*([0-9\.\-]+)", content)
-        features_match = re.search(r"Features.?:\s(.*)", content)
-
-        rows.append({
-            "crop": crop,
-            "r2": float(r2_match.group(1)) if r2_match else None,
-            "mae": float(mae_match.group(1)) if mae_match else None,
-            "features": features_match.group(1) if features_match else ""
-        })
-
-df = pd.DataFrame(rows)
-df.to_csv(OUTPUT_FILE, index=False)
-print(f"✔ Combined results written to {OUTPUT_FILE}")
\ No newline at end of file
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-crop model metrics from the metrics store.")
+    parser.add_argument("--runs", action="store_true", help="List recorded training runs instead")
+    parser.add_argument("--compare", nargs=2, metavar=("RUN_A", "RUN_B"), help="Compare two runs crop by crop")
+    args = parser.parse_args()
+
+    if args.runs or args.compare:
+        with pd.option_context("display.width", 200, "display.max_columns", None):
+            print(metrics_store.list_runs() if args.runs else metrics_store.compare_runs(*args.compare))
+        return
+
+    df = metrics_store.latest_per_crop()
+    # Original report columns first, then provenance
+    df = df[["crop", "r2", "mae", "features", "rows", "run_id", "created_at", "model_key", "data_hash",
+             "train_seconds"]]
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    df.to_csv(OUTPUT_FILE, index=False)
+    print(f"✔ Combined results written to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
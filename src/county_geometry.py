@@ -0,0 +1,56 @@
+import os
+import logging
+import geopandas as gpd
+
+# ------------------ CONFIG ------------------
+MAP_FILE = "data/raw/cv_county_boundaries.geojson"
+CACHE_FILE = "data/processed/cv_county_boundaries_3857.parquet"
+# Web Mercator, so basemap tiles line up without warping
+TARGET_CRS = "EPSG:3857"
+# Metres; well below a pixel at county-map scale
+SIMPLIFY_TOLERANCE = 100
+
+# cache path -> (source mtime_ns, GeoDataFrame)
+_CACHE = {}
+
+
+# ------------------ PREPROCESS ------------------
+def preprocess(gdf, crs=TARGET_CRS, tolerance=SIMPLIFY_TOLERANCE):
+    """Reproject, simplify and add the normalised `county` join key used by the crop tables."""
+    gdf = gdf.to_crs(crs)
+    gdf["geometry"] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    gdf["county"] = gdf["NAME"].str.upper().str.replace(" ", "_")
+    return gdf
+
+
+# ------------------ LOADING ------------------
+def load_counties(map_file=None, cache_file=None):
+    """County boundaries in TARGET_CRS, preprocessed once and cached as GeoParquet.
+
+    The cache is rebuilt when the source GeoJSON is newer than it. The returned
+    frame is shared between callers in this process; copy before modifying it.
+    """
+    map_file = map_file or MAP_FILE
+    cache_file = cache_file or CACHE_FILE
+    source_mtime = os.stat(map_file).st_mtime_ns
+
+    cached = _CACHE.get(cache_file)
+    if cached is not None and cached[0] == source_mtime:
+        return cached[1]
+
+    if os.path.exists(cache_file) and os.stat(cache_file).st_mtime_ns >= source_mtime:
+        gdf = gpd.read_parquet(cache_file)
+    else:
+        gdf = preprocess(gpd.read_file(map_file))
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_path = cache_file + ".tmp"
+        gdf.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_file)
+        logging.info(f"Cached {len(gdf)} county boundaries to {cache_file}")
+
+    _CACHE[cache_file] = (source_mtime, gdf)
+    return gdf
+
+
+def clear_cache():
+    _CACHE.clear()
@@ -0,0 +1,70 @@
+import os
+import logging
+import pandas as pd
+
+import instrumentation
+
+# ------------------ CONFIG ------------------
+CROP_DIR = "data/processed/by_crop"
+YIELD_COL = "yield"
+TEMP_COL = "tmax_mean"
+MIN_ROWS = 10
+
+# path -> ((size, mtime_ns), DataFrame)
+_CACHE = {}
+
+
+# ------------------ LOADING ------------------
+def list_crops(crop_dir=None):
+    crop_dir = crop_dir or CROP_DIR
+    return sorted(f[:-len(".csv")] for f in os.listdir(crop_dir) if f.endswith(".csv"))
+
+
+def load_crop(crop, crop_dir=None):
+    """Parsed per-crop CSV, re-read only when the file's size or mtime changes.
+
+    The cached frame is shared between callers; use `analysis_frame` or copy
+    before modifying it.
+    """
+    path = os.path.join(crop_dir or CROP_DIR, f"{crop}.csv")
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _CACHE.get(path)
+    if cached is None or cached[0] != stamp:
+        with instrumentation.span("read_crop_csv", "io", crop=crop) as current:
+            _CACHE[path] = (stamp, pd.read_csv(path))
+            current.rows = len(_CACHE[path][1])
+    return _CACHE[path][1]
+
+
+def load_all_crops(crop_dir=None):
+    return {crop: load_crop(crop, crop_dir) for crop in list_crops(crop_dir)}
+
+
+def clear_cache():
+    _CACHE.clear()
+
+
+# ------------------ FILTERING ------------------
+def analysis_frame(df, required=(YIELD_COL, TEMP_COL), min_rows=MIN_ROWS):
+    """Rows with all `required` columns present, or None if a column is absent or too few rows remain.
+
+    Always returns a new frame, so callers may add columns freely.
+    """
+    if any(col not in df.columns for col in required):
+        return None
+    df = df.dropna(subset=list(required))
+    if len(df) < min_rows:
+        return None
+    return df.copy()
+
+
+def iter_analysis_crops(required=(YIELD_COL, TEMP_COL), min_rows=MIN_ROWS, crops=None, crop_dir=None):
+    """(crop, filtered frame) for every crop with enough usable rows."""
+    crops = crops if crops is not None else load_all_crops(crop_dir)
+    for crop, df in crops.items():
+        filtered = analysis_frame(df, required, min_rows)
+        if filtered is None:
+            logging.warning(f"{crop}: Not enough data.")
+            continue
+        yield crop, filtered
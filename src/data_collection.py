@@ -1,11 +1,19 @@
 # src/data_collection.py
 
 import os
+import json
+import time
+import hashlib
+import datetime
 import pandas as pd
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+from api_client import build_session, get_with_retry
+import instrumentation
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -13,6 +21,16 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 load_dotenv()
 API_KEY = os.getenv("USDA_API_KEY")
 
+BASE_URL = "https://quickstats.nass.usda.gov/api/api_GET/"
+CACHE_DIR = "data/raw/usda_cache"
+MAX_WORKERS = 4
+# NASS revises recent estimates; older years are final and never need re-downloading
+REVISION_WINDOW_YEARS = 2
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+# A 400 usually means "no records" but can also be a bad query or a transient fault,
+# so it is remembered only briefly, whatever the year
+NO_DATA_TTL_SECONDS = 24 * 3600
+
 # Central Valley county names
 CENTRAL_VALLEY_COUNTIES = [
     'Shasta', 'Tehama', 'Butte', 'Glenn', 'Yolo', 'Sutter', 'Colusa',
@@ -20,38 +38,102 @@ CENTRAL_VALLEY_COUNTIES = [
     'Tulare', 'Madera'
 ]
 
-def fetch_all_crop_data(year_start=2010, year_end=2024):
+# ------------------ RESPONSE CACHE ------------------
+def _cache_path(params):
+    # The API key is not part of the query identity
+    key = json.dumps({k: v for k, v in params.items() if k != 'key'}, sort_keys=True)
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+
+def _no_data_path(path):
+    return path[:-len(".json")] + ".400.json"
+
+
+def _cache_is_fresh(path, year):
+    if not os.path.exists(path):
+        return False
+    if year < datetime.date.today().year - REVISION_WINDOW_YEARS:
+        return True
+    return time.time() - os.path.getmtime(path) < CACHE_TTL_SECONDS
+
+
+def _no_data_is_fresh(path):
+    marker = _no_data_path(path)
+    return os.path.exists(marker) and time.time() - os.path.getmtime(marker) < NO_DATA_TTL_SECONDS
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+def fetch_county_year(session, county, year):
+    """Fetch one county-year of QuickStats records, served from the on-disk cache when still fresh."""
+    params = {
+        'key': API_KEY,
+        'source_desc': 'SURVEY',
+        'sector_desc': 'CROPS',
+        'agg_level_desc': 'COUNTY',
+        'state_alpha': 'CA',
+        'county_name': county,
+        'year': str(year),
+        'format': 'JSON'
+    }
+    path = _cache_path(params)
+    if _cache_is_fresh(path, year):
+        with open(path) as f:
+            return json.load(f)
+    if _no_data_is_fresh(path):
+        return []
+
+    try:
+        response = get_with_retry(session, BASE_URL, params=params)
+        data = response.json().get("data", [])
+    except requests.exceptions.HTTPError as err:
+        # QuickStats answers 400 when a query matches no records
+        if err.response is None or err.response.status_code != 400:
+            raise
+        body = err.response.text[:500]
+        logging.warning(f"400 from QuickStats for {county} {year}: {body}")
+        _write_json(_no_data_path(path), {"status": 400, "body": body})
+        return []
+
+    _write_json(path, data)
+    if os.path.exists(_no_data_path(path)):
+        os.remove(_no_data_path(path))
+    return data
+
+
+@instrumentation.traced("fetch", rows=len)
+def fetch_all_crop_data(year_start=2010, year_end=2024, max_workers=MAX_WORKERS):
     """Fetch all crop-related statistics from USDA NASS for Central Valley counties."""
-    base_url = "https://quickstats.nass.usda.gov/api/api_GET/"
+    session = build_session(pool_size=max_workers)
     all_records = []
 
-    for county in CENTRAL_VALLEY_COUNTIES:
-        logging.info(f"Fetching data for {county}...")
-        params = {
-            'key': API_KEY,
-            'source_desc': 'SURVEY',
-            'sector_desc': 'CROPS',
-            'agg_level_desc': 'COUNTY',
-            'state_alpha': 'CA',
-            'county_name': county,
-            'year__GE': str(year_start),
-            'year__LE': str(year_end),
-            'format': 'JSON'
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_county_year, session, county, year): (county, year)
+            for county in CENTRAL_VALLEY_COUNTIES
+            for year in range(year_start, year_end + 1)
         }
-
-        try:
-            response = requests.get(base_url, params=params)
-            response.raise_for_status()
-            data = response.json().get("data", [])
+        for future in as_completed(futures):
+            county, year = futures[future]
+            try:
+                data = future.result()
+            except requests.exceptions.HTTPError as err:
+                logging.error(f"HTTP error for {county} {year}: {err}")
+                continue
+            except Exception as e:
+                logging.error(f"General error for {county} {year}: {e}")
+                continue
             if data:
                 all_records.extend(data)
-                logging.info(f"✓ Retrieved {len(data)} records from {county}")
+                logging.info(f"✓ Retrieved {len(data)} records from {county} {year}")
             else:
-                logging.warning(f"No records found for {county}")
-        except requests.exceptions.HTTPError as err:
-            logging.error(f"HTTP error for {county}: {err}")
-        except Exception as e:
-            logging.error(f"General error for {county}: {e}")
+                logging.warning(f"No records found for {county} {year}")
 
     if not all_records:
         logging.error("No data collected from any county.")
@@ -72,7 +154,7 @@ def fetch_all_crop_data(year_start=2010, year_end=2024):
     df['value'] = pd.to_numeric(df['value'].str.replace(",", ""), errors='coerce')
     df['county_fips'] = df['county_fips'].astype(str).str.zfill(3)
     df = df.dropna(subset=["value"])
-    return df
+    return df.sort_values(['county', 'year']).reset_index(drop=True)
 
 if __name__ == "__main__":
     try:
@@ -85,4 +167,4 @@ if __name__ == "__main__":
         else:
             logging.warning("⚠ No data to save.")
     except Exception as e:
-        logging.error(f"Script failed: {str(e)}")
\ No newline at end of file
+        logging.error(f"Script failed: {str(e)}")
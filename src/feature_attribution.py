@@ -0,0 +1,268 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+
+import model_registry
+import model_crop_yield
+import plot_rendering
+
+# ------------------ CONFIG ------------------
+OUTPUT_FILE = os.path.join(model_crop_yield.OUTPUT_DIR, "feature_attribution.csv")
+FIGURE_TEMPLATE = os.path.join(model_crop_yield.OUTPUT_DIR, "feature_attribution_{method}.png")
+CACHE_DIR = "data/processed/attribution_cache"
+# Part of every cache key: changing these recomputes the attributions
+SETTINGS = {"n_repeats": 10, "seed": 42, "version": 1}
+TREE_BATCH = 25
+METHODS = {
+    "impurity_importance": "Impurity importance (training split)",
+    "permutation_importance": "Permutation importance (R² drop on hold-out rows)",
+    "mean_abs_shap": "Mean |tree SHAP| (all rows)",
+}
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ TREE SHAP ------------------
+# Path-dependent TreeSHAP (Lundberg et al., Algorithm 2), vectorized over samples:
+# every sample walks the same recursion, only its "one fractions" (whether it
+# follows a split) differ, so path weights are arrays with one entry per sample.
+
+def _extend(path, zero, one, feature, n):
+    d, z, o, w = path
+    depth = len(d)
+    d, z, o = d + [feature], z + [zero], o + [one]
+    w = w + [np.ones(n) if depth == 0 else np.zeros(n)]
+    for i in range(depth - 1, -1, -1):
+        w[i + 1] = w[i + 1] + one * w[i] * (i + 1) / (depth + 1)
+        w[i] = zero * w[i] * (depth - i) / (depth + 1)
+    return d, z, o, w
+
+
+def _unwind(path, index):
+    """The path with element `index` removed, as if it had never been extended."""
+    d, z, o, w = path
+    depth = len(d) - 1
+    one, zero = o[index], z[index]
+    has_one = one != 0
+    safe_one = np.where(has_one, one, 1.0)
+    w = list(w[:-1])
+    next_one = path[3][depth]
+    for i in range(depth - 1, -1, -1):
+        with_one = next_one * (depth + 1) / ((i + 1) * safe_one)
+        next_one = np.where(has_one, w[i] - with_one * zero * (depth - i) / (depth + 1), next_one)
+        w[i] = np.where(has_one, with_one, w[i] * (depth + 1) / (zero * (depth - i)))
+    keep = [j for j in range(depth + 1) if j != index]
+    return [d[j] for j in keep], [z[j] for j in keep], [o[j] for j in keep], w
+
+
+def _unwound_sum(path, index):
+    """Total path weight after unwinding `index`, without building the unwound path."""
+    _, z, o, w = path
+    depth = len(w) - 1
+    one, zero = o[index], z[index]
+    has_one = one != 0
+    safe_one = np.where(has_one, one, 1.0)
+    next_one = w[depth]
+    total_one = np.zeros_like(next_one)
+    total_zero = np.zeros_like(next_one)
+    for i in range(depth - 1, -1, -1):
+        tmp = next_one / ((i + 1) * safe_one)
+        total_one += tmp
+        next_one = w[i] - tmp * zero * (depth - i)
+        total_zero += w[i] / (zero * (depth - i))
+    return np.where(has_one, total_one, total_zero) * (depth + 1)
+
+
+def tree_shap(tree, X):
+    """SHAP values of one fitted sklearn regression tree for every row of X, shape (rows, features)."""
+    t = tree.tree_
+    left, right = t.children_left, t.children_right
+    feature, threshold = t.feature, t.threshold
+    value, cover = t.value[:, 0, 0], t.weighted_n_node_samples
+    n = len(X)
+    phi = np.zeros((n, X.shape[1]))
+
+    def recurse(node, path, zero, one, split_feature):
+        path = _extend(path, zero, one, split_feature, n)
+        if left[node] == right[node]:  # leaf
+            d, z, o, _ = path
+            for i in range(1, len(d)):
+                phi[:, d[i]] += _unwound_sum(path, i) * (o[i] - z[i]) * value[node]
+            return
+        f = feature[node]
+        incoming_zero, incoming_one = 1.0, np.ones(n)
+        if f in path[0]:
+            k = path[0].index(f)
+            incoming_zero, incoming_one = path[1][k], path[2][k]
+            path = _unwind(path, k)
+        goes_left = X[:, f] <= threshold[node]
+        for child, follows in ((left[node], goes_left), (right[node], ~goes_left)):
+            recurse(child, path, incoming_zero * cover[child] / cover[node], incoming_one * follows, f)
+
+    recurse(0, ([], [], [], []), 1.0, np.ones(n), -1)
+    return phi
+
+
+# ------------------ WORKER ------------------
+_CROPS = {}
+
+
+def load_crop(crop, key):
+    """Registered artifact plus its imputed feature matrix and hold-out rows, cached per worker."""
+    if (crop, key) not in _CROPS:
+        # Tasks arrive grouped by crop, so only the current model is kept
+        _CROPS.clear()
+        artifact = model_registry.load(crop, key)
+        df, _ = model_crop_yield.prepare_crop_data(os.path.join(model_crop_yield.INPUT_DIR, f"{crop}.csv"))
+        X = artifact["imputer"].transform(df[artifact["feature_cols"]])
+        y = df[model_crop_yield.YIELD_COL_NAME].to_numpy()
+        # Same split the model was evaluated on in model_crop_yield
+        _, test = train_test_split(np.arange(len(df)), test_size=model_crop_yield.TEST_SIZE,
+                                   random_state=model_crop_yield.SPLIT_SEED)
+        artifact["model"].n_jobs = 1
+        _CROPS[(crop, key)] = (artifact, X, y, test)
+    return _CROPS[(crop, key)]
+
+
+def _permutation_task(crop, key, j):
+    artifact, X, y, test = load_crop(crop, key)
+    model, X_test, y_test = artifact["model"], X[test], y[test]
+    baseline = r2_score(y_test, model.predict(X_test))
+    drops = []
+    for repeat in range(SETTINGS["n_repeats"]):
+        rng = np.random.default_rng([SETTINGS["seed"], j, repeat])
+        X_perm = X_test.copy()
+        X_perm[:, j] = rng.permutation(X_perm[:, j])
+        drops.append(baseline - r2_score(y_test, model.predict(X_perm)))
+    return np.mean(drops), np.std(drops)
+
+
+def _shap_task(crop, key, start, stop):
+    artifact, X, _, _ = load_crop(crop, key)
+    # Summed here, divided by the forest size when batches are combined
+    return sum(tree_shap(tree, X) for tree in artifact["model"].estimators_[start:stop])
+
+
+def _run_task(task):
+    kind, crop, key, *args = task
+    result = _permutation_task(crop, key, *args) if kind == "permutation" else _shap_task(crop, key, *args)
+    return task, result
+
+
+# ------------------ STAGE ------------------
+def _cache_path(crop, key):
+    return os.path.join(CACHE_DIR, crop, f"{model_registry.registry_key(key, SETTINGS)}.parquet")
+
+
+def _current_models(crops=None):
+    """(crop, registry key) of every latest model whose dataset is unchanged since it was trained."""
+    params = model_crop_yield._hyperparameters()
+    models = []
+    for crop in crops or model_registry.list_crops():
+        path = os.path.join(model_crop_yield.INPUT_DIR, f"{crop}.csv")
+        if not os.path.exists(path):
+            continue
+        key = model_registry.registry_key(model_registry.file_hash(path), params)
+        if not model_registry.exists(crop, key):
+            logging.warning(f"{crop}: no model trained on the current dataset; run model_crop_yield.py first.")
+            continue
+        models.append((crop, key))
+    return models
+
+
+def compute_attributions(crops=None, max_workers=None, force=False):
+    """Impurity, permutation and tree-SHAP attributions for every current per-crop model, as one long table."""
+    tables, todo = [], {}
+    for crop, key in _current_models(crops):
+        cache = _cache_path(crop, key)
+        if not force and os.path.exists(cache):
+            tables.append(pd.read_parquet(cache))
+        else:
+            todo[crop] = key
+    logging.info(f"Attributing {len(todo)} model(s); {len(tables)} served from cache")
+
+    if todo:
+        start = time.perf_counter()
+        tasks, meta = [], {}
+        for crop, key in todo.items():
+            artifact = model_registry.load(crop, key)
+            meta[crop] = artifact
+            n_trees = len(artifact["model"].estimators_)
+            tasks += [("permutation", crop, key, j) for j in range(len(artifact["feature_cols"]))]
+            tasks += [("shap", crop, key, s, min(s + TREE_BATCH, n_trees)) for s in range(0, n_trees, TREE_BATCH)]
+
+        permutation = {crop: {} for crop in todo}
+        shap_sums = {crop: 0 for crop in todo}
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for task, result in pool.map(_run_task, tasks, chunksize=1):
+                kind, crop, _, *args = task
+                if kind == "permutation":
+                    permutation[crop][args[0]] = result
+                else:
+                    shap_sums[crop] = shap_sums[crop] + result
+        logging.info(f"Ran {len(tasks)} attribution task(s) in {time.perf_counter() - start:.1f}s")
+
+        for crop, key in todo.items():
+            artifact = meta[crop]
+            features = artifact["feature_cols"]
+            shap_values = shap_sums[crop] / len(artifact["model"].estimators_)
+            table = pd.DataFrame({
+                "crop": crop,
+                "model_key": key,
+                "feature": features,
+                "impurity_importance": artifact["model"].feature_importances_,
+                "permutation_importance": [permutation[crop][j][0] for j in range(len(features))],
+                "permutation_std": [permutation[crop][j][1] for j in range(len(features))],
+                "mean_abs_shap": np.abs(shap_values).mean(axis=0),
+            })
+            os.makedirs(os.path.dirname(_cache_path(crop, key)), exist_ok=True)
+            tmp_path = _cache_path(crop, key) + ".tmp"
+            table.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, _cache_path(crop, key))
+            tables.append(table)
+
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True).sort_values(["crop", "feature"], ignore_index=True)
+
+
+def attribution_jobs(table):
+    """One crop × feature heatmap per method, each crop's row scaled to shares of its total."""
+    jobs = []
+    for method, title in METHODS.items():
+        grid = table.pivot(index="crop", columns="feature", values=method).clip(lower=0)
+        grid = grid.div(grid.sum(axis=1).replace(0, np.nan), axis=0)
+        jobs.append(plot_rendering.make_job(
+            "heatmap", FIGURE_TEMPLATE.format(method=method), title,
+            values=grid.to_numpy(), rows=list(grid.index), columns=list(grid.columns),
+            label="Share of crop's total attribution"))
+    return jobs
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Permutation and tree-SHAP attributions for the trained per-crop models.")
+    parser.add_argument("--crops", nargs="*", help="Crops to attribute (default: every registered model)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="Recompute attributions even when cached")
+    args = parser.parse_args()
+
+    table = compute_attributions(args.crops, args.workers, args.force)
+    if table.empty:
+        logging.warning("No trained models to attribute.")
+        return
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    table.to_csv(OUTPUT_FILE, index=False)
+    plot_rendering.render_jobs(attribution_jobs(table))
+    logging.info(f"✔ Saved feature attributions for {table['crop'].nunique()} crop(s) to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,95 @@
 import os
 import pandas as pd
 import numpy as np
-from glob import glob
 from collections import defaultdict
 from sklearn.impute import KNNImputer
+from sklearn.neighbors import BallTree
 import logging
 
+import climate_store
+import instrumentation
+
 # -------------------- CONFIG --------------------
 INPUT_DIR = "data/raw/climate_noaa"
 OUTPUT_DIR = "data/processed"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "climate_features_2010_2024.csv")
+AGRO_OUTPUT_FILE = os.path.join(OUTPUT_DIR, "agroclimate_features_2010_2024.csv")
 YEARS = list(range(2010, 2025))
 VARIABLES = ["TMAX", "TMIN", "PRCP"]
+METRICS = ["tmax_mean", "tmin_mean", "prcp_total"]
+STATION_MAP_PATH = "data/raw/county_station_map_2.csv"
+N_NEIGHBORS = 3
+# Extra candidates per county so a neighbour that is itself missing can be skipped
+N_CANDIDATES = 10
+IMPUTE_YEAR_CHUNK = 10
+EARTH_RADIUS_KM = 6371.0
+
+# Crop temperature thresholds (°C) and growing-season months (inclusive).
+# gdd_base/gdd_cap bound the daily temperatures used for growing degree days,
+# kdd_threshold is where daily tmax starts counting as killing degree days.
+# Winter grains are sown in autumn, so their window is the Jan–May half of the season.
+CROP_THRESHOLDS = {
+    "corn":     {"gdd_base": 10.0, "gdd_cap": 30.0, "kdd_threshold": 29.0, "season": (4, 9)},
+    "cotton":   {"gdd_base": 15.6, "gdd_cap": 30.0, "kdd_threshold": 32.0, "season": (4, 10)},
+    "rice":     {"gdd_base": 10.0, "gdd_cap": 30.0, "kdd_threshold": 35.0, "season": (5, 9)},
+    "tomatoes": {"gdd_base": 10.0, "gdd_cap": 30.0, "kdd_threshold": 32.0, "season": (4, 9)},
+    "beans":    {"gdd_base": 10.0, "gdd_cap": 30.0, "kdd_threshold": 30.0, "season": (5, 9)},
+    "wheat":    {"gdd_base": 0.0,  "gdd_cap": 26.0, "kdd_threshold": 30.0, "season": (1, 5)},
+    "barley":   {"gdd_base": 0.0,  "gdd_cap": 26.0, "kdd_threshold": 30.0, "season": (1, 5)},
+}
+FROST_THRESHOLD = 0.0
+HOT_DAY_THRESHOLD = 35.0
 
 # -------------------- LOGGING --------------------
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 # -------------------- STEP 1: Aggregate Daily to Annual --------------------
-def summarize_annual_climate():
-    summary_rows = []
-    missing_log = defaultdict(list)
+def _partial_sums(daily):
+    """Per county-year sums and counts; mergeable across chunks, unlike means."""
+    grouped = daily.groupby(["county", "year"], observed=True)[VARIABLES]
+    return grouped.sum().join(grouped.count(), rsuffix="_n")
 
-    county_dirs = sorted(glob(os.path.join(INPUT_DIR, "*")))
-    for county_dir in county_dirs:
-        county = os.path.basename(county_dir)
-        for year in YEARS:
-            file_path = os.path.join(county_dir, f"{county}_{year}.csv")
-            if not os.path.exists(file_path):
-                logging.warning(f"Missing file: {county} {year}")
-                missing_log[county].append(year)
-                summary_rows.append({
-                    "county": county,
-                    "year": year,
-                    "tmax_mean": np.nan,
-                    "tmin_mean": np.nan,
-                    "prcp_total": np.nan
-                })
-                continue
 
-            try:
-                df = pd.read_csv(file_path)
-                summary_rows.append({
-                    "county": county,
-                    "year": year,
-                    "tmax_mean": df["TMAX"].mean() if "TMAX" in df.columns else np.nan,
-                    "tmin_mean": df["TMIN"].mean() if "TMIN" in df.columns else np.nan,
-                    "prcp_total": df["PRCP"].sum() if "PRCP" in df.columns else np.nan
-                })
-            except Exception as e:
-                logging.error(f"Error reading {file_path}: {e}")
-                missing_log[county].append(year)
-                summary_rows.append({
-                    "county": county,
-                    "year": year,
-                    "tmax_mean": np.nan,
-                    "tmin_mean": np.nan,
-                    "prcp_total": np.nan
-                })
-
-    return pd.DataFrame(summary_rows), missing_log
+@instrumentation.traced("aggregate", rows=lambda result: len(result[0]))
+def summarize_annual_climate(chunked=False, batch_size=1_000_000):
+    """Annual tmax/tmin means and precipitation totals for every county x year in one grouped pass.
+
+    With `chunked=True` the store is streamed in record batches and only the
+    per-batch partial sums are held in memory.
+    """
+    # Legacy CSV downloads are folded into the Parquet store on first use
+    climate_store.migrate_csv_tree(INPUT_DIR)
+    columns = ["county", "year"] + VARIABLES
+    if chunked:
+        batches = climate_store.iter_daily_batches(columns=columns, years=YEARS, batch_size=batch_size)
+    else:
+        batches = [climate_store.read_daily(columns=columns, years=YEARS)]
+
+    partials = [_partial_sums(batch) for batch in batches]
+    partials = [p for p in partials if not p.empty]
+    if not partials:
+        return pd.DataFrame(columns=["county", "year", "tmax_mean", "tmin_mean", "prcp_total"]), {}
+    totals = pd.concat(partials).groupby(level=["county", "year"]).sum()
+
+    annual = pd.DataFrame({
+        "tmax_mean": totals["TMAX"] / totals["TMAX_n"].where(totals["TMAX_n"] > 0),
+        "tmin_mean": totals["TMIN"] / totals["TMIN_n"].where(totals["TMIN_n"] > 0),
+        "prcp_total": totals["PRCP"].where(totals["PRCP_n"] > 0),
+    })
+
+    # Reindexing against the full grid turns absent county-years into NaN rows
+    counties = sorted(totals.index.get_level_values("county").unique())
+    grid = pd.MultiIndex.from_product([counties, YEARS], names=["county", "year"])
+    missing = grid.difference(annual.index)
+    annual = annual.reindex(grid).reset_index()
+
+    missing_log = defaultdict(list)
+    for county, year in missing:
+        missing_log[county].append(year)
+    return annual, missing_log
 
 # -------------------- STEP 2: KNN Impute Missing --------------------
+@instrumentation.traced("impute", rows=len)
 def impute_climate_data(df):
     pivoted = df.pivot(index="year", columns="county", values=["tmax_mean", "tmin_mean", "prcp_total"])
     
@@ -87,7 +116,7 @@ def impute_climate_data(df):
 
     # Melt and unstack
     melted = imputed_df.melt(id_vars=["year"], var_name="metric_county", value_name="value")
-    melted[["metric", "county"]] = melted["metric_county"].str.extract(r"(\w+)_(.+)")
+    melted[["metric", "county"]] = melted["metric_county"].str.extract(rf"({'|'.join(METRICS)})_(.+)")
     final_df = melted.drop(columns="metric_county").pivot_table(
         index=["county", "year"],
         columns="metric",
@@ -96,6 +125,144 @@ def impute_climate_data(df):
 
     return final_df
 
+def load_county_coordinates(path=STATION_MAP_PATH):
+    """Station latitude/longitude per county, keyed by the underscored county names used in the climate data."""
+    stations = pd.read_csv(path)
+    stations["county"] = stations["county"].str.strip().str.replace(" ", "_")
+    return stations.groupby("county")[["latitude", "longitude"]].mean()
+
+
+@instrumentation.traced("impute", rows=len)
+def impute_climate_spatial(df, coords, n_neighbors=N_NEIGHBORS, year_chunk=IMPUTE_YEAR_CHUNK):
+    """Fill missing county-year metrics with the inverse-distance mean of the nearest counties that same year.
+
+    Works on the long (county, year) frame: neighbours come from a haversine
+    BallTree over county coordinates, and values are looked up by sorted
+    county-year keys, so memory grows with rows rather than counties squared.
+    """
+    df = df.copy()
+    counties = pd.Index(coords.index)
+    known = df["county"].isin(counties)
+    if not known.all():
+        logging.warning(f"No coordinates for: {sorted(df.loc[~known, 'county'].unique())}")
+
+    tree = BallTree(np.radians(coords[["latitude", "longitude"]].to_numpy()), metric="haversine")
+    k = min(N_CANDIDATES + 1, len(counties))
+    dist, nbrs = tree.query(np.radians(coords[["latitude", "longitude"]].to_numpy()), k=k)
+    # Drop each county from its own neighbour list
+    not_self = nbrs != np.arange(len(counties))[:, None]
+    nbrs = np.where(not_self, nbrs, -1)
+    dist_km = dist * EARTH_RADIUS_KM
+
+    county_code = counties.get_indexer(df["county"])
+    year = df["year"].to_numpy()
+    year_min = year.min() if len(year) else 0
+    n_years = (year.max() - year_min + 1) if len(year) else 0
+    row_key = county_code.astype(np.int64) * n_years + (year - year_min)
+
+    for start in range(year_min, year_min + n_years, year_chunk):
+        in_chunk = (year >= start) & (year < start + year_chunk) & (county_code >= 0)
+        for metric in METRICS:
+            values = df[metric].to_numpy()
+            observed = in_chunk & ~np.isnan(values)
+            missing = np.flatnonzero(in_chunk & np.isnan(values))
+            if not len(missing) or not observed.any():
+                continue
+
+            order = np.argsort(row_key[observed])
+            obs_keys, obs_values = row_key[observed][order], values[observed][order]
+
+            cand = nbrs[county_code[missing]]
+            cand_keys = cand.astype(np.int64) * n_years + (year[missing] - year_min)[:, None]
+            pos = np.clip(np.searchsorted(obs_keys, cand_keys), 0, len(obs_keys) - 1)
+            found = (cand >= 0) & (obs_keys[pos] == cand_keys)
+            # Keep only the closest n_neighbors candidates that actually have data
+            found &= np.cumsum(found, axis=1) <= n_neighbors
+
+            weights = np.where(found, 1.0 / np.maximum(dist_km[county_code[missing]], 1e-6), 0.0)
+            total = weights.sum(axis=1)
+            filled = np.where(found, obs_values[pos], 0.0)
+            estimates = np.divide((weights * filled).sum(axis=1), total, out=np.full(len(missing), np.nan), where=total > 0)
+            df.iloc[missing, df.columns.get_loc(metric)] = estimates
+
+    return df
+
+# -------------------- STEP 3: Agro-Climatic Features --------------------
+def _longest_spells(flags, starts, gaps=None):
+    """Longest run of consecutive True flags in each contiguous group beginning at `starts`.
+
+    Rows marked in `gaps` (e.g. a missing day before them) start a new run too.
+    """
+    idx = np.arange(len(flags))
+    run_start = np.zeros(len(flags), dtype=bool) if gaps is None else gaps.copy()
+    run_start[starts] = True
+    # Last row that breaks a run: a False flag, or the row before a run's first row
+    boundary = np.where(~flags, idx, np.where(run_start, idx - 1, -1))
+    streak = np.where(flags, idx - np.maximum.accumulate(boundary), 0)
+    return np.maximum.reduceat(streak, starts)
+
+
+@instrumentation.traced("aggregate", rows=len)
+def compute_agroclimate_features(daily, thresholds=None):
+    """Heat-stress and seasonal features for every county-year from daily TMAX/TMIN/PRCP.
+
+    All per-day quantities are built as one NumPy matrix and summed with a
+    single segmented reduction, so adding crops or features adds columns to
+    that matrix rather than passes over the data.
+    """
+    thresholds = thresholds or CROP_THRESHOLDS
+    daily = daily.sort_values(["county", "date"], kind="stable").reset_index(drop=True)
+    county_codes = pd.factorize(daily["county"])[0]
+    year = daily["year"].to_numpy()
+    new_group = np.r_[True, (county_codes[1:] != county_codes[:-1]) | (year[1:] != year[:-1])][:len(daily)]
+    starts = np.flatnonzero(new_group)
+
+    tmax = daily["TMAX"].to_numpy(dtype=float)
+    tmin = daily["TMIN"].to_numpy(dtype=float)
+    prcp = daily["PRCP"].to_numpy(dtype=float)
+    dates = pd.DatetimeIndex(daily["date"])
+    month = dates.month.to_numpy()
+    hot = tmax >= HOT_DAY_THRESHOLD
+    # A missing day ends a hot spell even if the days on both sides are hot
+    gaps = np.r_[False, np.diff(dates.to_numpy()) != np.timedelta64(1, "D")]
+
+    columns = {
+        "frost_days": tmin <= FROST_THRESHOLD,
+        "hot_days": hot,
+        "temp_days_observed": ~(np.isnan(tmax) | np.isnan(tmin)),
+    }
+    for crop, cfg in thresholds.items():
+        start, end = cfg["season"]
+        in_season = (month >= start) & (month <= end)
+        base, cap = cfg["gdd_base"], cfg["gdd_cap"]
+        # Modified (capped) GDD: both extremes are clamped to [base, cap] before averaging
+        gdd = (np.clip(tmax, base, cap) + np.clip(tmin, base, cap)) / 2 - base
+        kdd = np.maximum(tmax - cfg["kdd_threshold"], 0)
+        season_tmax = in_season & ~np.isnan(tmax)
+        columns[f"gdd_{crop}"] = np.where(in_season, np.nan_to_num(gdd), 0.0)
+        columns[f"kdd_{crop}"] = np.where(in_season, np.nan_to_num(kdd), 0.0)
+        columns[f"season_prcp_{crop}"] = np.where(in_season, np.nan_to_num(prcp), 0.0)
+        columns[f"season_tmax_sum_{crop}"] = np.where(season_tmax, tmax, 0.0)
+        columns[f"season_tmax_n_{crop}"] = season_tmax
+
+    names = list(columns)
+    # Column-major so each feature is a contiguous segment for reduceat
+    matrix = np.empty((len(daily), len(names)), order="F")
+    for j, name in enumerate(names):
+        matrix[:, j] = columns[name]
+    if len(daily):
+        features = pd.DataFrame(np.add.reduceat(matrix, starts, axis=0), columns=names)
+        features["max_hot_spell"] = _longest_spells(hot, starts, gaps)
+    else:
+        features = pd.DataFrame(columns=names + ["max_hot_spell"], dtype=float)
+    for crop in thresholds:
+        n = features.pop(f"season_tmax_n_{crop}")
+        features[f"season_tmax_mean_{crop}"] = features.pop(f"season_tmax_sum_{crop}") / n.where(n > 0)
+
+    features.index = pd.MultiIndex.from_frame(daily.loc[starts, ["county", "year"]])
+    grid = pd.MultiIndex.from_product([sorted(daily["county"].unique()), YEARS], names=["county", "year"])
+    return features.reindex(grid).reset_index()
+
 # -------------------- MAIN --------------------
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -106,9 +273,18 @@ def main():
     for county, years in missing_log.items():
         logging.info(f"  {county}: missing {len(years)} years")
 
-    df_imputed = impute_climate_data(df_summary)
+    if os.path.exists(STATION_MAP_PATH):
+        df_imputed = impute_climate_spatial(df_summary, load_county_coordinates())
+    else:
+        logging.warning(f"{STATION_MAP_PATH} not found, falling back to year-wise KNN imputation")
+        df_imputed = impute_climate_data(df_summary)
     df_imputed.to_csv(OUTPUT_FILE, index=False)
     logging.info(f"✔ Saved output to {OUTPUT_FILE}")
 
+    daily = climate_store.read_daily(columns=["county", "year", "date"] + VARIABLES, years=YEARS)
+    df_agro = compute_agroclimate_features(daily)
+    df_agro.to_csv(AGRO_OUTPUT_FILE, index=False)
+    logging.info(f"✔ Saved agro-climatic features to {AGRO_OUTPUT_FILE}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,48 +1,136 @@
 import os
-import pandas as pd
-import geopandas as gpd
+import math
+import argparse
+import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
+from matplotlib.collections import PathCollection
+from matplotlib.path import Path
+from shapely.geometry.polygon import orient
+
+import crop_data
+import climate_bands
+import county_geometry
+import instrumentation
 
 # ------------------ CONFIG ------------------
-CROP = "corn"  # set crop here
-DATA_FILE = f"data/processed/by_crop/{CROP}.csv"
-MAP_FILE = "data/raw/cv_county_boundaries.geojson"  # must match FIPS/names
-OUTPUT_FILE = f"results/climate_trends/{CROP}_hot_year_yield_map.png"
+OUTPUT_DIR = "results/climate_trends"
+GRID_FILE = os.path.join(OUTPUT_DIR, "all_crops_hot_year_yield_maps.png")
 TEMP_COL = "tmax_mean"
 YIELD_COL = "yield"
+DELTA_COL = "yield_change_hot_minus_normal"
+GRID_COLS = 4
+
+# ------------------ PROCESS ------------------
+def compute_crop_county_deltas(crops=None):
+    """Hot-minus-normal mean yield per crop and county, each crop tagged against its own thresholds."""
+    stacked = climate_bands.stack_crops(crop_data.iter_analysis_crops(crops=crops))
+    if stacked.empty:
+        return stacked
+    stacked = climate_bands.tag_bands(stacked, by="crop", include_cool=False, temp_col=TEMP_COL)
+    deltas = climate_bands.hot_vs_normal(stacked, by=["crop", "county"], yield_col=YIELD_COL)
+    return deltas.rename(columns={"yield_change": DELTA_COL})
+
+
+def merge_with_geometry(deltas):
+    """County geometry with one delta column per crop, from a single merge."""
+    wide = deltas.pivot(index="county", columns="crop", values=DELTA_COL)
+    gdf = county_geometry.load_counties()
+    return gdf.merge(wide, left_on="county", right_index=True, how="left"), list(wide.columns)
+
+
+# ------------------ PLOT ------------------
+def county_paths(gdf):
+    """One compound matplotlib path per county, built once and shared by every panel."""
+    paths = []
+    for geom in gdf.geometry:
+        polygons = getattr(geom, "geoms", [geom])
+        rings = [Path(np.asarray(ring.coords)[:, :2])
+                 for poly in polygons
+                 for ring in [orient(poly).exterior, *orient(poly).interiors]]
+        paths.append(Path.make_compound_path(*rings))
+    return paths
+
+
+def _draw(paths, values, crop, ax, cax):
+    """Choropleth of one crop's values on prebuilt paths; geopandas' plot() forces a full redraw per call."""
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    collection = PathCollection(paths, cmap="RdBu", edgecolor="black", linewidth=0.8)
+    collection.set_array(np.ma.masked_invalid(values))
+    if (~missing).any():
+        collection.set_clim(np.nanmin(values), np.nanmax(values))
+    ax.add_collection(collection)
+    if missing.any():
+        ax.add_collection(PathCollection([p for p, m in zip(paths, missing) if m],
+                                         facecolor="lightgrey", edgecolor="black", linewidth=0.8))
+    ax.autoscale_view()
+    ax.set_aspect("equal")
+    ax.get_figure().colorbar(collection, cax=cax)
+    ax.set_title(f"{crop.title()} – Yield Change (Hot vs Normal Years)")
+    ax.axis("off")
+
+
+def render_crop_files(merged, crop_names, output_dir=OUTPUT_DIR):
+    """One PNG per crop, redrawn on a single reused figure."""
+    paths = county_paths(merged)
+    fig, ax = plt.subplots(1, 1, figsize=(8, 6))
+    fig.subplots_adjust(left=0.03, right=0.85)
+    outputs = []
+    for crop in crop_names:
+        # clear() also drops the previous crop's inset colour bar
+        ax.clear()
+        cax = ax.inset_axes([1.03, 0.1, 0.04, 0.8])
+        _draw(paths, merged[crop], crop, ax, cax)
+        path = os.path.join(output_dir, f"{crop}_hot_year_yield_map.png")
+        fig.savefig(path)
+        outputs.append(path)
+    plt.close(fig)
+    return outputs
+
+
+def render_crop_grid(merged, crop_names, output_file=GRID_FILE, ncols=GRID_COLS):
+    """Every crop as a panel of one small-multiples figure, each with its own colour scale."""
+    paths = county_paths(merged)
+    ncols = min(ncols, len(crop_names))
+    nrows = math.ceil(len(crop_names) / ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(4.5 * ncols, 3.5 * nrows), squeeze=False)
+    fig.subplots_adjust(left=0.02, right=0.95, bottom=0.02, top=0.96, wspace=0.3, hspace=0.25)
+    for ax, crop in zip(axes.flat, crop_names):
+        cax = ax.inset_axes([1.03, 0.1, 0.04, 0.8])
+        _draw(paths, merged[crop], crop, ax, cax)
+        ax.title.set_fontsize(9)
+        cax.tick_params(labelsize=7)
+    for ax in axes.flat[len(crop_names):]:
+        ax.axis("off")
+    fig.savefig(output_file)
+    plt.close(fig)
+    return output_file
+
+
+@instrumentation.traced("plot")
+def render_hot_year_maps(crops=None, layout="both"):
+    """Hot-year yield-change maps for every crop: a small-multiples grid, per-crop PNGs, or both."""
+    deltas = compute_crop_county_deltas(crops)
+    if deltas.empty:
+        print("No crops with enough data to map.")
+        return
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    merged, crop_names = merge_with_geometry(deltas)
+
+    if layout in ("files", "both"):
+        paths = render_crop_files(merged, crop_names)
+        print(f"Saved {len(paths)} per-crop maps to {OUTPUT_DIR}")
+    if layout in ("grid", "both"):
+        print(f"Saved map grid to {render_crop_grid(merged, crop_names)}")
+
+# ------------------ ENTRY ------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map hot-vs-normal yield change by county for every crop.")
+    parser.add_argument("--crops", nargs="*", help="Crops to map (default: every dataset in data/processed/by_crop)")
+    parser.add_argument("--layout", choices=["grid", "files", "both"], default="both")
+    args = parser.parse_args()
 
-# ------------------ LOAD ------------------
-df = pd.read_csv(DATA_FILE)
-df = df.dropna(subset=[YIELD_COL, TEMP_COL])
-
-# Tag hot years
-mean_temp = df[TEMP_COL].mean()
-std_temp = df[TEMP_COL].std()
-df["climate_band"] = df[TEMP_COL].apply(lambda t: "hot" if t > mean_temp + std_temp else "normal")
-
-# Aggregate by county and climate band
-grouped = df.groupby(["county", "climate_band"])[YIELD_COL].mean().unstack().reset_index()
-grouped["yield_change_hot_minus_normal"] = grouped.get("hot", 0) - grouped.get("normal", 0)
-
-# Load geo and merge
-gdf = gpd.read_file(MAP_FILE)
-gdf["county"] = gdf["NAME"].str.upper().str.replace(" ", "_")
-merged = gdf.merge(grouped, on="county", how="left")
-
-# Plot
-fig, ax = plt.subplots(1, 1, figsize=(8, 6))
-merged.plot(
-    column="yield_change_hot_minus_normal",
-    cmap="RdBu",
-    legend=True,
-    ax=ax,
-    missing_kwds={"color": "lightgrey", "label": "No data"},
-    edgecolor="black"
-)
-ax.set_title(f"{CROP.title()} – Yield Change (Hot vs Normal Years)")
-plt.axis("off")
-plt.tight_layout()
-plt.savefig(OUTPUT_FILE)
-plt.close()
-print(f"Saved map to {OUTPUT_FILE}")
\ No newline at end of file
+    selected = None
+    if args.crops:
+        selected = {crop: crop_data.load_crop(crop) for crop in args.crops}
+    render_hot_year_maps(selected, args.layout)
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import resource
+import functools
+import threading
+import datetime
+import logging
+from contextlib import contextmanager
+import pandas as pd
+
+# ------------------ CONFIG ------------------
+# When set, every process appends its finished spans to <dir>/<pid>.jsonl so that
+# subprocesses and pool workers all land in one trace
+TRACE_DIR_ENV = "CV_TRACE_DIR"
+TRACE_ROOT = "results/traces"
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ MEMORY ------------------
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux); elsewhere the peak is process-lifetime."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+
+
+def children_peak_rss_mb():
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+
+
+# ------------------ SPANS ------------------
+class Span:
+    """A running span; set `rows` or extra attributes on it before the block ends."""
+
+    def __init__(self, name, category, rows, attrs):
+        self.name, self.category = name, category
+        self.rows = rows
+        self.attrs = attrs
+        self.peak = 0.0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    # A forked pool worker inherits its parent's open spans; it starts its own
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid, _local.stack = os.getpid(), []
+    return _local.stack
+
+
+def trace_dir():
+    return os.environ.get(TRACE_DIR_ENV)
+
+
+def enable(directory):
+    """Persist spans from this process and every process it starts under `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    os.environ[TRACE_DIR_ENV] = os.path.abspath(directory)
+
+
+@contextmanager
+def span(name, category="stage", rows=None, memory=True, **attrs):
+    """Time a block: wall and CPU seconds, peak RSS and an optional row count.
+
+    Peak RSS works by resetting the process high-water mark, which is process-wide,
+    so spans opened concurrently from several threads should pass memory=False.
+    """
+    stack = _stack()
+    if memory:
+        # Fold the peak so far into enclosing spans before resetting it for this one
+        peak = peak_rss_mb()
+        for outer in stack:
+            outer.peak = max(outer.peak, peak)
+        reset_peak_rss()
+    current = Span(name, category, rows, dict(attrs))
+    parent = stack[-1].name if stack else None
+    stack.append(current)
+    started_at = time.time()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    finally:
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        stack.pop()
+        record = {
+            "name": name,
+            "category": category,
+            "process": os.path.basename(sys.argv[0]) or "python",
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "parent": parent,
+            "depth": len(stack),
+            "start": started_at,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": None,
+            "rows": current.rows,
+            "attrs": current.attrs,
+        }
+        if memory:
+            current.peak = max(current.peak, peak_rss_mb())
+            record["peak_rss_mb"] = round(current.peak, 1)
+            for outer in stack:
+                outer.peak = max(outer.peak, current.peak)
+        _finish(record, top_level=not stack)
+
+
+def traced(category="stage", name=None, rows=None, memory=True):
+    """Decorator form of `span`; `rows` is an optional function of the return value."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, category, memory=memory) as current:
+                result = fn(*args, **kwargs)
+                if rows is not None and result is not None:
+                    current.rows = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def _finish(record, top_level):
+    directory = trace_dir()
+    # Without a trace directory nobody reads the records, so nothing is kept
+    if not directory:
+        return
+    with _lock:
+        _records.append(record)
+        if not top_level:
+            return
+        # Flushed as soon as a top-level span closes: pool workers never run atexit hooks
+        pending = [r for r in _records if r["pid"] == os.getpid()]
+        _records.clear()
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{os.getpid()}.jsonl"), "a") as f:
+            for r in pending:
+                f.write(json.dumps(r, default=str) + "\n")
+
+
+def records():
+    """Nested spans finished in this process while tracing, waiting for their top-level span to flush them."""
+    with _lock:
+        return [r for r in _records if r["pid"] == os.getpid()]
+
+
+# ------------------ REPORTS ------------------
+def load_trace_dir(directory):
+    spans = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path) as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    return sorted(spans, key=lambda r: r["start"])
+
+
+def summarize(spans):
+    """Totals per span name, slowest first. Nested spans are counted in their parents too."""
+    if not spans:
+        return pd.DataFrame(columns=["category", "name", "count", "wall_s", "cpu_s", "peak_rss_mb", "rows"])
+    df = pd.DataFrame(spans)
+    summary = df.groupby(["category", "name"], as_index=False).agg(
+        count=("wall_s", "size"), wall_s=("wall_s", "sum"), cpu_s=("cpu_s", "sum"),
+        peak_rss_mb=("peak_rss_mb", "max"), rows=("rows", lambda rows: rows.sum(min_count=1)))
+    return summary.sort_values("wall_s", ascending=False, ignore_index=True)
+
+
+def chrome_trace(spans):
+    """Spans as Chrome trace-event "complete" events (chrome://tracing, Perfetto)."""
+    events = []
+    for pid, process in {(r["pid"], r["process"]) for r in spans}:
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"{process} ({pid})"}})
+    for r in spans:
+        events.append({
+            "name": r["name"], "cat": r["category"], "ph": "X",
+            "ts": round(r["start"] * 1e6), "dur": round(r["wall_s"] * 1e6),
+            "pid": r["pid"], "tid": r["tid"],
+            "args": {"cpu_s": r["cpu_s"], "peak_rss_mb": r["peak_rss_mb"], "rows": r["rows"], **r["attrs"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_trace(spans, json_path, chrome_path):
+    """Write the raw spans plus per-name totals as JSON, and the Chrome trace-event file."""
+    for path in (json_path, chrome_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    summary = summarize(spans)
+    with open(json_path, "w") as f:
+        json.dump({
+            "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "summary": json.loads(summary.to_json(orient="records")),
+            "spans": spans,
+        }, f, indent=2, default=str)
+    with open(chrome_path, "w") as f:
+        json.dump(chrome_trace(spans), f, default=str)
+    logging.info(f"✔ Trace of {len(spans)} span(s) saved to {json_path} and {chrome_path}")
+    return summary
+
+
+def new_trace_dir():
+    return os.path.join(TRACE_ROOT, datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Merge per-process span files into a JSON and a Chrome trace.")
+    parser.add_argument("trace_dir", help=f"Directory the scripts wrote spans to (via {TRACE_DIR_ENV})")
+    parser.add_argument("--top", type=int, default=20, help="Rows of the per-span summary to print")
+    args = parser.parse_args()
+
+    spans = load_trace_dir(args.trace_dir)
+    summary = write_trace(spans, os.path.join(args.trace_dir, "trace.json"),
+                          os.path.join(args.trace_dir, "trace.chrome.json"))
+    print(summary.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import json
+import uuid
+import sqlite3
+import datetime
+import pandas as pd
+
+# ------------------ CONFIG ------------------
+STORE_FILE = "results/metrics_store.sqlite"
+COLUMNS = ["run_id", "created_at", "crop", "model", "model_key", "data_hash", "params", "trained",
+           "train_seconds", "rows", "r2", "mae", "features"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id        TEXT NOT NULL,
+    created_at    TEXT NOT NULL,
+    crop          TEXT NOT NULL,
+    model         TEXT NOT NULL,
+    model_key     TEXT,
+    data_hash     TEXT,
+    params        TEXT,
+    trained       INTEGER,
+    train_seconds REAL,
+    rows          INTEGER,
+    r2            REAL,
+    mae           REAL,
+    features      TEXT
+);
+CREATE INDEX IF NOT EXISTS metrics_crop_latest ON metrics (model, crop, id);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id, crop);
+"""
+
+
+# ------------------ CONNECTION ------------------
+def connect(path=None):
+    path = path or STORE_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def new_run_id():
+    """Sortable, unique id for one training run: timestamp plus a random suffix."""
+    return f"{datetime.datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+# ------------------ WRITES ------------------
+def record(rows, path=None):
+    """Append metric records (dicts keyed by COLUMNS) in one transaction. Rows are never updated."""
+    created_at = datetime.datetime.now().isoformat(timespec="seconds")
+    values = []
+    for row in rows:
+        row = {"created_at": created_at, **row}
+        if not isinstance(row.get("params"), (str, type(None))):
+            row["params"] = json.dumps(row["params"], sort_keys=True)
+        if isinstance(row.get("features"), (list, tuple)):
+            row["features"] = ", ".join(row["features"])
+        values.append(tuple(row.get(col) for col in COLUMNS))
+    with connect(path) as conn:
+        conn.executemany(f"INSERT INTO metrics ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                         values)
+    conn.close()
+    return len(values)
+
+
+# ------------------ QUERIES ------------------
+def _query(sql, params=(), path=None):
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def latest_per_crop(model="random_forest", path=None):
+    """Most recent record for every crop of one model type."""
+    return _query(f"""
+        SELECT {', '.join(COLUMNS)} FROM metrics
+        WHERE id IN (SELECT MAX(id) FROM metrics WHERE model = ? GROUP BY crop)
+        ORDER BY crop
+    """, (model,), path)
+
+
+def list_runs(path=None):
+    return _query("""
+        SELECT run_id, MIN(created_at) AS created_at, COUNT(*) AS crops, SUM(trained) AS trained,
+               AVG(r2) AS mean_r2, AVG(mae) AS mean_mae,
+               SUM(CASE WHEN trained THEN train_seconds END) AS train_seconds
+        FROM metrics GROUP BY run_id ORDER BY MIN(id)
+    """, path=path)
+
+
+def compare_runs(run_a, run_b, path=None):
+    """Per-crop metrics of two runs side by side, with run_b minus run_a deltas."""
+    runs = _query(f"SELECT {', '.join(COLUMNS)} FROM metrics WHERE run_id IN (?, ?)", (run_a, run_b), path)
+    a = runs[runs["run_id"] == run_a].set_index("crop")
+    b = runs[runs["run_id"] == run_b].set_index("crop")
+    cols = ["r2", "mae", "rows", "train_seconds", "data_hash", "model_key"]
+    out = a[cols].join(b[cols], how="outer", lsuffix="_a", rsuffix="_b")
+    out["r2_delta"] = out["r2_b"] - out["r2_a"]
+    out["mae_delta"] = out["mae_b"] - out["mae_a"]
+    out["data_changed"] = out["data_hash_a"] != out["data_hash_b"]
+    return out.drop(columns=["data_hash_a", "data_hash_b"]).reset_index()
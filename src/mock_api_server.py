@@ -0,0 +1,258 @@
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import logging
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from api_client import TokenBucket
+
+# ------------------ CONFIG ------------------
+NOAA_DATA_PATH = "/cdo-web/api/v2/data"
+NOAA_STATIONS_PATH = "/cdo-web/api/v2/stations"
+USDA_PATH = "/api/api_GET/"
+STATS_PATH = "/_stats"
+NOAA_MAX_LIMIT = 1000
+USDA_COMMODITIES = ["CORN", "COTTON", "RICE", "TOMATOES", "BEANS", "WHEAT", "BARLEY", "ALMONDS"]
+USDA_STATISTICS = {"YIELD": "BU / ACRE", "AREA HARVESTED": "ACRES", "PRODUCTION": "BU"}
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the stand-in services. Rates are shared across all endpoints, as NOAA's per-token limit is."""
+    latency: float = 0.0           # seconds added to every response
+    jitter: float = 0.0            # uniform extra latency in [0, jitter]
+    rate: float = 0.0              # requests/second before answering 429; 0 disables
+    burst: float = None            # token bucket capacity (default: rate)
+    retry_after: float = 1.0       # Retry-After header sent with 429s
+    error_rate: float = 0.0        # fraction of requests answered with a 503
+    stations_per_county: int = 3
+    empty_station_rate: float = 0.1  # stations that return NOAA's empty body for every year
+    empty_usda_rate: float = 0.1     # county-years answered with QuickStats' 400 "no data"
+    seed: int = 42
+
+
+@dataclass
+class MockStats:
+    requests: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    by_path: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, path, status):
+        with self._lock:
+            self.requests += 1
+            self.rate_limited += status == 429
+            self.errors += status >= 500
+            counts = self.by_path.setdefault(path, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"requests": self.requests, "rate_limited": self.rate_limited,
+                    "errors": self.errors, "by_path": json.loads(json.dumps(self.by_path))}
+
+
+# ------------------ SYNTHETIC PAYLOADS ------------------
+def _rng(config, *key):
+    return np.random.default_rng([config.seed, zlib.crc32("|".join(map(str, key)).encode())])
+
+
+def _station_is_empty(config, station_id):
+    return _rng(config, "empty", station_id).random() < config.empty_station_rate
+
+
+def noaa_daily_records(config, station_id, start, end, datatypes):
+    """Every GHCND record for a station between two dates, in NOAA's date-then-datatype order."""
+    dates = pd.date_range(start, end, freq="D")
+    if _station_is_empty(config, station_id) or len(dates) == 0:
+        return []
+    rng = _rng(config, station_id, start)
+    season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 105) / 365.25)
+    values = {
+        "TMAX": 24 + 10 * season + rng.normal(0, 3, len(dates)),
+        "TMIN": 11 + 8 * season + rng.normal(0, 2, len(dates)),
+        "PRCP": np.where(rng.random(len(dates)) < 0.15 * (1 - season), rng.gamma(1.2, 6, len(dates)), 0.0),
+    }
+    stamps = dates.strftime("%Y-%m-%dT00:00:00")
+    records = []
+    for i, stamp in enumerate(stamps):
+        for datatype in sorted(datatypes):
+            if datatype in values:
+                records.append({"date": stamp, "datatype": datatype, "station": station_id,
+                                "attributes": ",,7,2400", "value": round(float(values[datatype][i]), 1)})
+    return records
+
+
+def noaa_stations(config, location_id):
+    fips = location_id.split(":")[-1]
+    rng = _rng(config, "stations", fips)
+    lat, lon = 35 + 5 * rng.random(), -122 + 3 * rng.random()
+    return [{
+        "id": f"GHCND:USC00{fips[-3:]}{i:03d}",
+        "name": f"STATION {fips} {i}, CA US",
+        "latitude": round(lat + rng.normal(0, 0.2), 4),
+        "longitude": round(lon + rng.normal(0, 0.2), 4),
+        "elevation": round(float(rng.uniform(10, 500)), 1),
+        "elevationUnit": "METERS",
+        "mindate": "1990-01-01",
+        "maxdate": "2024-12-31",
+        "datacoverage": round(float(rng.uniform(0.6, 1.0)), 4),
+    } for i in range(config.stations_per_county)]
+
+
+def usda_records(config, county, year):
+    rng = _rng(config, "usda", county, year)
+    if rng.random() < config.empty_usda_rate:
+        return None
+    records = []
+    for commodity in USDA_COMMODITIES:
+        if rng.random() < 0.3:
+            continue
+        for statistic, unit in USDA_STATISTICS.items():
+            value = rng.uniform(50, 200) if statistic == "YIELD" else rng.uniform(1_000, 500_000)
+            records.append({
+                "year": int(year), "state_name": "CALIFORNIA", "county_name": county.upper(),
+                "county_ansi": f"{zlib.crc32(county.encode()) % 1000:03d}", "commodity_desc": commodity,
+                "short_desc": f"{commodity} - {statistic}, MEASURED IN {unit}",
+                "statisticcat_desc": statistic, "domain_desc": "TOTAL",
+                # QuickStats sends numbers as strings with thousands separators
+                "Value": f"{value:,.1f}", "unit_desc": unit,
+            })
+    return records
+
+
+def paginate(records, params):
+    """NOAA CDO paging: 1-based `offset`, `limit` capped at 1000, with resultset metadata."""
+    limit = min(int(params.get("limit", ["25"])[0]), NOAA_MAX_LIMIT)
+    offset = max(int(params.get("offset", ["1"])[0]), 1)
+    page = records[offset - 1:offset - 1 + limit]
+    return {"metadata": {"resultset": {"offset": offset, "count": len(records), "limit": limit}},
+            "results": page}
+
+
+# ------------------ SERVER ------------------
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logging.debug(fmt % args)
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.stats.record(self.path_only, status)
+
+    def _json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode(), headers)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.path_only = url.path
+        params = parse_qs(url.query)
+        config = self.server.config
+
+        if url.path == STATS_PATH:
+            return self._json(200, self.server.stats.as_dict())
+
+        delay = config.latency + (random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if self.server.limiter is not None and not self.server.limiter.try_acquire():
+            return self._json(429, {"status": "429", "message": "Too Many Requests"},
+                              {"Retry-After": f"{config.retry_after:g}"})
+        if config.error_rate and random.random() < config.error_rate:
+            return self._json(503, {"message": "Service Unavailable"})
+
+        if url.path == NOAA_DATA_PATH:
+            records = noaa_daily_records(config, params["stationid"][0], params["startdate"][0],
+                                         params["enddate"][0], params.get("datatypeid", ["TMAX", "TMIN", "PRCP"]))
+            # NOAA answers an empty body, not an empty result list, when nothing matches
+            return self._send(200, b"") if not records else self._json(200, paginate(records, params))
+        if url.path == NOAA_STATIONS_PATH:
+            return self._json(200, paginate(noaa_stations(config, params["locationid"][0]), params))
+        if url.path == USDA_PATH:
+            records = usda_records(config, params["county_name"][0], params["year"][0])
+            if records is None:
+                return self._json(400, {"error": ["bad request - invalid query"]})
+            return self._json(200, {"data": records})
+        return self._json(404, {"message": "Not Found"})
+
+
+class MockAPIServer:
+    """Threaded local stand-in for NOAA CDO and USDA QuickStats, usable as a context manager."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or MockConfig()
+        self.httpd = ThreadingHTTPServer((host, port), MockHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = self.config
+        self.httpd.stats = MockStats()
+        self.httpd.limiter = TokenBucket(self.config.rate, self.config.burst) if self.config.rate else None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def stats(self):
+        return self.httpd.stats
+
+    def reset_stats(self):
+        self.httpd.stats = MockStats()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock NOAA CDO and USDA QuickStats endpoints locally.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests/second before 429s (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, jitter=args.jitter, rate=args.rate, error_rate=args.error_rate)
+    server = MockAPIServer(config, port=args.port)
+    logging.info(f"Mock NOAA/USDA API listening on {server.url} (stats at {STATS_PATH})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
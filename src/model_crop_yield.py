@@ -1,104 +1,208 @@
 import os
+import time
 import pandas as pd
 import numpy as np
 import logging
-import matplotlib.pyplot as plt
-import seaborn as sns
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 from sklearn.impute import SimpleImputer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import model_registry
+import metrics_store
+import instrumentation
+import plot_rendering
 
 # ------------------ CONFIG ------------------
 INPUT_DIR = "data/processed/by_crop"
 OUTPUT_DIR = "results/yield_models"
 YIELD_COL_NAME = "yield"
+MODEL_PARAMS = {"n_estimators": 100, "random_state": 42}
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
 
 # ------------------ LOGGING ------------------
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 # ------------------ UTILS ------------------
-def plot_actual_vs_pred(y_true, y_pred, crop_name, out_path):
-    plt.figure(figsize=(6, 6))
-    sns.scatterplot(x=y_true, y=y_pred)
-    plt.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()], "--", color="red")
-    plt.xlabel("Actual Yield")
-    plt.ylabel("Predicted Yield")
-    plt.title(f"{crop_name} – Actual vs Predicted Yield")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
-
-def plot_feature_importance(model, feature_names, crop_name, out_path):
-    importances = model.feature_importances_
-    indices = np.argsort(importances)[::-1]
-    plt.figure(figsize=(8, 4))
-    sns.barplot(x=importances[indices], y=np.array(feature_names)[indices])
-    plt.title(f"{crop_name} – Feature Importance")
-    plt.tight_layout()
-    plt.savefig(out_path)
-    plt.close()
+def actual_vs_pred_job(y_true, y_pred, crop_name, out_path):
+    return plot_rendering.make_job("actual_vs_pred", out_path, f"{crop_name} – Actual vs Predicted Yield",
+                                   y_true=y_true, y_pred=y_pred)
 
-# ------------------ MODELING ------------------
-def model_yield_per_crop():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".csv")]
+def feature_importance_job(model, feature_names, crop_name, out_path):
+    return plot_rendering.make_job("bar", out_path, f"{crop_name} – Feature Importance",
+                                   values=model.feature_importances_, labels=list(feature_names))
 
-    for file in files:
-        crop_name = file.replace(".csv", "")
-        path = os.path.join(INPUT_DIR, file)
+# ------------------ MODELING ------------------
+def prepare_crop_data(path):
+    """Load a per-crop dataset and pick its usable numeric features, or return None if it can't be modeled."""
+    crop_name = os.path.basename(path).replace(".csv", "")
+    with instrumentation.span("read_crop_csv", "io", crop=crop_name) as current:
         df = pd.read_csv(path)
+        current.rows = len(df)
 
-        if YIELD_COL_NAME not in df.columns:
-            logging.warning(f"No 'yield' column in {file}, skipping.")
-            continue
+    if YIELD_COL_NAME not in df.columns:
+        logging.warning(f"No 'yield' column in {os.path.basename(path)}, skipping.")
+        return None
 
-        logging.info(f"Processing crop: {crop_name} – total rows: {len(df)}")
+    logging.info(f"Processing crop: {crop_name} – total rows: {len(df)}")
 
-        df = df.dropna(subset=[YIELD_COL_NAME])
-        if len(df) < 10:
-            logging.warning(f"Not enough rows with yield: {crop_name}")
-            continue
+    df = df.dropna(subset=[YIELD_COL_NAME])
+    if len(df) < 10:
+        logging.warning(f"Not enough rows with yield: {crop_name}")
+        return None
 
-        feature_cols = [col for col in df.columns if col not in ["county", "year", "commodity", YIELD_COL_NAME] and df[col].dtype in [np.float64, np.int64]]
+    feature_cols = [col for col in df.columns if col not in ["county", "year", "commodity", YIELD_COL_NAME] and df[col].dtype in [np.float64, np.int64]]
 
-        # Drop features with too much missing data
-        feature_cols = [col for col in feature_cols if df[col].isna().mean() < 0.5]
-        if not feature_cols:
-            logging.warning(f"No usable features left for {crop_name}")
-            continue
+    # Drop features with too much missing data
+    feature_cols = [col for col in feature_cols if df[col].isna().mean() < 0.5]
+    if not feature_cols:
+        logging.warning(f"No usable features left for {crop_name}")
+        return None
 
-        logging.info(f"{crop_name} – Using features: {feature_cols}")
+    return df, feature_cols
 
-        X = df[feature_cols]
-        y = df[YIELD_COL_NAME]
 
-        # Impute remaining missing values (mean imputation)
-        imputer = SimpleImputer(strategy="mean")
-        X_imputed = imputer.fit_transform(X)
+def train_crop_model(crop_name, path, n_jobs=1):
+    """Fit imputer + forest for one crop and evaluate it on a held-out split."""
+    prepared = prepare_crop_data(path)
+    if prepared is None:
+        return None
+    df, feature_cols = prepared
+    logging.info(f"{crop_name} – Using features: {feature_cols}")
 
-        X_train, X_test, y_train, y_test = train_test_split(X_imputed, y, test_size=0.2, random_state=42)
+    X = df[feature_cols]
+    y = df[YIELD_COL_NAME]
 
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
-        y_pred = model.predict(X_test)
-
-        r2 = r2_score(y_test, y_pred)
-        mae = mean_absolute_error(y_test, y_pred)
+    # Impute remaining missing values (mean imputation)
+    imputer = SimpleImputer(strategy="mean")
+    X_imputed = imputer.fit_transform(X)
 
-        logging.info(f"{crop_name} – R²: {r2:.3f}, MAE: {mae:.2f}, rows modeled: {len(df)}")
+    X_train, X_test, y_train, y_test = train_test_split(X_imputed, y, test_size=TEST_SIZE, random_state=SPLIT_SEED)
 
-        # Save metrics
-        with open(os.path.join(OUTPUT_DIR, f"{crop_name}_metrics.txt"), "w") as f:
-            f.write(f"R²: {r2:.4f}\n")
-            f.write(f"MAE: {mae:.4f}\n")
-            f.write(f"Rows: {len(df)}\n")
-            f.write(f"Features used: {', '.join(feature_cols)}\n")
+    start = time.perf_counter()
+    with instrumentation.span("fit_crop_model", "train", rows=len(X_train), crop=crop_name):
+        model = RandomForestRegressor(**MODEL_PARAMS, n_jobs=n_jobs)
+        model.fit(X_train, y_train)
+    train_seconds = time.perf_counter() - start
+    y_pred = model.predict(X_test)
+
+    return {
+        "crop": crop_name,
+        "model": model,
+        "imputer": imputer,
+        "feature_cols": feature_cols,
+        "rows": len(df),
+        "r2": r2_score(y_test, y_pred),
+        "mae": mean_absolute_error(y_test, y_pred),
+        "y_test": y_test,
+        "y_pred": y_pred,
+        "train_seconds": train_seconds,
+    }
+
+
+def _hyperparameters():
+    return {"model": MODEL_PARAMS, "test_size": TEST_SIZE, "split_seed": SPLIT_SEED}
+
+
+def _write_outputs(result):
+    """Write the metrics file and return the crop's plot jobs."""
+    crop_name = result["crop"]
+    logging.info(f"{crop_name} – R²: {result['r2']:.3f}, MAE: {result['mae']:.2f}, rows modeled: {result['rows']}")
+
+    # Save metrics
+    with open(os.path.join(OUTPUT_DIR, f"{crop_name}_metrics.txt"), "w") as f:
+        f.write(f"R²: {result['r2']:.4f}\n")
+        f.write(f"MAE: {result['mae']:.4f}\n")
+        f.write(f"Rows: {result['rows']}\n")
+        f.write(f"Features used: {', '.join(result['feature_cols'])}\n")
+
+    return [
+        actual_vs_pred_job(result["y_test"], result["y_pred"], crop_name, os.path.join(OUTPUT_DIR, f"{crop_name}_actual_vs_pred.png")),
+        feature_importance_job(result["model"], result["feature_cols"], crop_name, os.path.join(OUTPUT_DIR, f"{crop_name}_feature_importance.png")),
+    ]
+
+
+def _store_record(result, run_id, data_hash, params, trained):
+    return {
+        "run_id": run_id,
+        "crop": result["crop"],
+        "model": "random_forest",
+        "model_key": result.get("registry_key"),
+        "data_hash": data_hash,
+        "params": params,
+        "trained": trained,
+        "train_seconds": result.get("train_seconds"),
+        "rows": result["rows"],
+        "r2": result["r2"],
+        "mae": result["mae"],
+        "features": result["feature_cols"],
+    }
+
+
+@instrumentation.traced("train")
+def model_yield_per_crop(max_workers=None):
+    """Train every crop in a process pool, reusing registered models whose data and hyperparameters are unchanged."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    files = sorted(f for f in os.listdir(INPUT_DIR) if f.endswith(".csv"))
+    params = _hyperparameters()
+    run_id = metrics_store.new_run_id()
 
-        # Save plots
-        plot_actual_vs_pred(y_test, y_pred, crop_name, os.path.join(OUTPUT_DIR, f"{crop_name}_actual_vs_pred.png"))
-        plot_feature_importance(model, feature_cols, crop_name, os.path.join(OUTPUT_DIR, f"{crop_name}_feature_importance.png"))
+    results, to_train, records = [], [], []
+    for file in files:
+        crop_name = file.replace(".csv", "")
+        path = os.path.join(INPUT_DIR, file)
+        data_hash = model_registry.file_hash(path)
+        key = model_registry.registry_key(data_hash, params)
+        cached = model_registry.load(crop_name, key)
+        if cached is not None:
+            logging.info(f"{crop_name} – ✓ Loaded registered model {key}")
+            model_registry.mark_latest(crop_name, key)
+            results.append(cached)
+            records.append(_store_record(cached, run_id, data_hash, params, trained=False))
+        else:
+            to_train.append((crop_name, path, key, data_hash))
+
+    if to_train:
+        # Split cores between concurrent fits so workers x n_jobs never exceeds the machine
+        cores = os.cpu_count() or 1
+        workers = max(1, min(max_workers or cores, len(to_train), cores))
+        n_jobs = max(1, cores // workers)
+        logging.info(f"Training {len(to_train)} crop model(s) on {workers} worker(s) with n_jobs={n_jobs}")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(train_crop_model, crop_name, path, n_jobs): (crop_name, key, data_hash)
+                       for crop_name, path, key, data_hash in to_train}
+            for future in as_completed(futures):
+                crop_name, key, data_hash = futures[future]
+                result = future.result()
+                if result is None:
+                    # No longer modelable: don't keep serving a model trained on older data
+                    if model_registry.clear_latest(crop_name):
+                        logging.warning(f"{crop_name} – skipped, retired its previously registered model")
+                    continue
+                result["registry_key"] = key
+                model_registry.save(crop_name, key, result)
+                results.append(result)
+                records.append(_store_record(result, run_id, data_hash, params, trained=True))
+
+    # Crops whose dataset disappeared altogether
+    current = {file.replace(".csv", "") for file in files}
+    for crop_name in model_registry.list_crops():
+        if crop_name not in current and model_registry.clear_latest(crop_name):
+            logging.warning(f"{crop_name} – no dataset, retired its previously registered model")
+
+    if records:
+        metrics_store.record(records)
+        logging.info(f"✔ Recorded run {run_id} ({len(records)} crop(s)) in {metrics_store.STORE_FILE}")
+
+    jobs = []
+    for result in sorted(results, key=lambda r: r["crop"]):
+        jobs.extend(_write_outputs(result))
+    plot_rendering.render_jobs(jobs)
+    return results
 
 # ------------------ ENTRY ------------------
 if __name__ == "__main__":
-    model_yield_per_crop()
\ No newline at end of file
+    model_yield_per_crop()
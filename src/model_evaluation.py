@@ -0,0 +1,264 @@
+import os
+import json
+import math
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import ParameterSampler
+
+import model_crop_yield
+
+# ------------------ CONFIG ------------------
+OUTPUT_FILE = os.path.join(model_crop_yield.OUTPUT_DIR, "cv_metrics.csv")
+TRIALS_FILE = os.path.join(model_crop_yield.OUTPUT_DIR, "cv_search_trials.csv")
+# Scheme name -> column whose values define the held-out groups
+CV_SCHEMES = {"county": "county", "year": "year"}
+PARAM_SPACE = {
+    "n_estimators": [50, 100, 200, 400],
+    "max_depth": [None, 4, 8, 16],
+    "min_samples_leaf": [1, 2, 5, 10],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+N_ITER = 12
+# Successive halving: configurations are scored on these fractions of the folds,
+# and only the best KEEP_FRACTION of them move on to the next rung
+RUNGS = (0.25, 0.5, 1.0)
+KEEP_FRACTION = 0.5
+SEARCH_SEED = 42
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ SHARED DATA ------------------
+def _share_arrays(arrays):
+    """Copy arrays into shared memory once; workers map the same pages instead of receiving pickles."""
+    handles, specs = [], {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        handles.append(shm)
+        specs[name] = (shm.name, array.shape, array.dtype.str)
+    return handles, specs
+
+
+_SHARED = {}
+_HANDLES = []
+
+
+def _attach(specs):
+    global _SHARED
+    _SHARED = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _HANDLES.append(shm)
+        _SHARED[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def load_crop_arrays(crops=None):
+    """Raw feature matrix (NaNs kept), target and group codes for every modelable crop.
+
+    Imputation happens per fold, so held-out rows never inform the training means.
+    """
+    files = sorted(f for f in os.listdir(model_crop_yield.INPUT_DIR) if f.endswith(".csv"))
+    data = {}
+    for file in files:
+        crop = file[:-len(".csv")]
+        if crops and crop not in crops:
+            continue
+        prepared = model_crop_yield.prepare_crop_data(os.path.join(model_crop_yield.INPUT_DIR, file))
+        if prepared is None:
+            continue
+        df, feature_cols = prepared
+        data[crop] = {
+            "X": df[feature_cols].to_numpy(dtype=np.float64),
+            "y": df[model_crop_yield.YIELD_COL_NAME].to_numpy(dtype=np.float64),
+            "county": pd.factorize(df["county"])[0].astype(np.int32),
+            "year": df["year"].to_numpy(dtype=np.int32),
+            "features": feature_cols,
+        }
+    return data
+
+
+# ------------------ WORKER ------------------
+def _fit_fold(crop, scheme, fold, params):
+    """Train on every group but `fold` and predict it, reading the crop's arrays from shared memory."""
+    X, y = _SHARED[f"{crop}/X"], _SHARED[f"{crop}/y"]
+    test = _SHARED[f"{crop}/{CV_SCHEMES[scheme]}"] == fold
+    # keep_empty_features: a column missing in every training row still maps to the test rows' columns
+    imputer = SimpleImputer(strategy="mean", keep_empty_features=True)
+    X_train = imputer.fit_transform(X[~test])
+    model = RandomForestRegressor(**params, n_jobs=1)
+    model.fit(X_train, y[~test])
+    return model.predict(imputer.transform(X[test]))
+
+
+def _run_task(task):
+    crop, scheme, config_id, fold, params = task
+    return task, _fit_fold(crop, scheme, fold, params)
+
+
+# ------------------ SEARCH ------------------
+def sample_configs(n_iter=N_ITER, seed=SEARCH_SEED):
+    """The current production parameters first, then `n_iter` random draws from PARAM_SPACE."""
+    baseline = dict(model_crop_yield.MODEL_PARAMS)
+    configs = [baseline]
+    for params in ParameterSampler(PARAM_SPACE, n_iter=n_iter, random_state=seed):
+        params = {**params, "random_state": baseline.get("random_state", 42)}
+        if params not in configs:
+            configs.append(params)
+    return configs
+
+
+class _Search:
+    """Successive-halving state for one crop under one CV scheme."""
+
+    def __init__(self, crop, scheme, y, groups, n_configs, seed):
+        self.crop, self.scheme = crop, scheme
+        self.y, self.groups = y, groups
+        folds = np.unique(groups)
+        np.random.default_rng(seed).shuffle(folds)
+        self.folds = [int(f) for f in folds]
+        self.alive = list(range(n_configs))
+        self.predictions = {cid: {} for cid in range(n_configs)}
+        self.stopped_at = {}
+
+    def tasks(self, fraction, configs):
+        n_folds = max(1, math.ceil(fraction * len(self.folds)))
+        for cid in self.alive:
+            for fold in self.folds[:n_folds]:
+                if fold not in self.predictions[cid]:
+                    yield (self.crop, self.scheme, cid, fold, configs[cid])
+
+    def pooled(self, cid):
+        folds = list(self.predictions[cid])
+        y_true = np.concatenate([self.y[self.groups == f] for f in folds])
+        y_pred = np.concatenate([self.predictions[cid][f] for f in folds])
+        return y_true, y_pred
+
+    def prune(self, rung):
+        """Keep the best KEEP_FRACTION by pooled MAE so far; the baseline (config 0) always survives."""
+        scores = {cid: mean_absolute_error(*self.pooled(cid)) for cid in self.alive}
+        keep = max(1, math.ceil(len(self.alive) * KEEP_FRACTION))
+        survivors = sorted(self.alive, key=scores.get)[:keep]
+        if 0 in self.alive and 0 not in survivors:
+            survivors.append(0)
+        for cid in set(self.alive) - set(survivors):
+            self.stopped_at[cid] = rung
+        self.alive = survivors
+
+    def fold_maes(self, cid):
+        return [mean_absolute_error(self.y[self.groups == f], p) for f, p in self.predictions[cid].items()]
+
+
+def evaluate_crops(crops=None, schemes=tuple(CV_SCHEMES), n_iter=N_ITER, max_workers=None, seed=SEARCH_SEED):
+    """Leave-one-group-out CV with a halving random search for every crop and scheme.
+
+    Returns (metrics, trials): one row per crop x scheme comparing the tuned
+    configuration with the current MODEL_PARAMS, and one row per configuration tried.
+    The tuned configuration is chosen on the same out-of-fold predictions it is
+    scored on, so its `selection_*` scores are optimistic; only `baseline_*` (a
+    fixed configuration) is an unbiased generalization estimate.
+    """
+    data = load_crop_arrays(crops)
+    configs = sample_configs(n_iter, seed)
+    searches = []
+    for crop, arrays in data.items():
+        for scheme in schemes:
+            groups = arrays[CV_SCHEMES[scheme]]
+            if len(np.unique(groups)) < 2:
+                logging.warning(f"{crop}: fewer than two {scheme} groups, skipping {scheme} CV")
+                continue
+            searches.append(_Search(crop, scheme, arrays["y"], groups, len(configs), seed))
+    if not searches:
+        return pd.DataFrame(), pd.DataFrame()
+
+    shared = {f"{crop}/{name}": arrays[name] for crop, arrays in data.items()
+              for name in ("X", "y", "county", "year")}
+    handles, specs = _share_arrays(shared)
+    by_key = {(s.crop, s.scheme): s for s in searches}
+    start, fits = time.perf_counter(), 0
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=(specs,)) as pool:
+            for rung, fraction in enumerate(RUNGS):
+                # Every crop and scheme's tasks for this rung go to the pool together
+                tasks = [t for s in searches for t in s.tasks(fraction, configs)]
+                for (crop, scheme, cid, fold, _), y_pred in pool.map(_run_task, tasks, chunksize=4):
+                    by_key[(crop, scheme)].predictions[cid][fold] = y_pred
+                fits += len(tasks)
+                logging.info(f"Rung {rung + 1}/{len(RUNGS)}: {len(tasks)} fold fits")
+                if rung < len(RUNGS) - 1:
+                    for s in searches:
+                        s.prune(rung + 1)
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+    logging.info(f"Cross-validated {len(searches)} crop × scheme searches with {fits} fits "
+                 f"in {time.perf_counter() - start:.1f}s")
+
+    metrics, trials = [], []
+    for s in searches:
+        for cid, params in enumerate(configs):
+            if not s.predictions[cid]:
+                continue
+            y_true, y_pred = s.pooled(cid)
+            trials.append({
+                "crop": s.crop, "cv": s.scheme, "config_id": cid, "params": json.dumps(params),
+                "folds_evaluated": len(s.predictions[cid]), "stopped_at_rung": s.stopped_at.get(cid),
+                "r2": r2_score(y_true, y_pred), "mae": mean_absolute_error(y_true, y_pred),
+            })
+        best = min(s.alive, key=lambda cid: mean_absolute_error(*s.pooled(cid)))
+        y_true, y_pred = s.pooled(best)
+        base_true, base_pred = s.pooled(0)
+        fold_maes = s.fold_maes(best)
+        metrics.append({
+            "crop": s.crop,
+            "cv": s.scheme,
+            "folds": len(s.folds),
+            "rows": len(s.y),
+            "selection_r2": r2_score(y_true, y_pred),
+            "selection_mae": mean_absolute_error(y_true, y_pred),
+            "selection_mae_fold_std": float(np.std(fold_maes)),
+            "baseline_r2": r2_score(base_true, base_pred),
+            "baseline_mae": mean_absolute_error(base_true, base_pred),
+            "best_params": json.dumps(configs[best]),
+            "features": ", ".join(data[s.crop]["features"]),
+        })
+    return pd.DataFrame(metrics), pd.DataFrame(trials)
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Spatial/temporal cross-validation and random search for the per-crop models.")
+    parser.add_argument("--crops", nargs="*", help="Crops to evaluate (default: every dataset in the input dir)")
+    parser.add_argument("--cv", nargs="*", choices=list(CV_SCHEMES), default=list(CV_SCHEMES),
+                        help="county = leave-one-county-out, year = leave-one-year-out")
+    parser.add_argument("--n-iter", type=int, default=N_ITER, help="Random configurations besides the baseline")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=SEARCH_SEED)
+    args = parser.parse_args()
+
+    metrics, trials = evaluate_crops(args.crops, args.cv, args.n_iter, args.workers, args.seed)
+    if metrics.empty:
+        logging.warning("No crops could be cross-validated.")
+        return
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    metrics.to_csv(OUTPUT_FILE, index=False)
+    trials.to_csv(TRIALS_FILE, index=False)
+    for row in metrics.itertuples():
+        logging.info(f"{row.crop} [{row.cv}] – baseline R²: {row.baseline_r2:.3f}, MAE: {row.baseline_mae:.2f} "
+                     f"(best of search, optimistic: R² {row.selection_r2:.3f}, MAE {row.selection_mae:.2f})")
+    logging.info(f"✔ Saved cross-validated metrics to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
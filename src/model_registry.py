@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import logging
+import joblib
+import sklearn
+
+# ------------------ CONFIG ------------------
+REGISTRY_DIR = "data/models"
+
+
+# ------------------ KEYS ------------------
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def registry_key(data_hash, params):
+    """Identity of a fitted model: training data, hyperparameters and the sklearn version that pickled it."""
+    payload = json.dumps({"data": data_hash, "params": params, "sklearn": sklearn.__version__}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+# ------------------ STORAGE ------------------
+def _artifact_path(crop, key):
+    return os.path.join(REGISTRY_DIR, crop, f"{key}.joblib")
+
+
+def exists(crop, key):
+    return os.path.exists(_artifact_path(crop, key))
+
+
+def load(crop, key):
+    """Registered artifact for this crop and key, or None if it was never trained."""
+    path = _artifact_path(crop, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable model {path}: {e}")
+        return None
+
+
+def save(crop, key, artifact):
+    """Persist a fitted artifact and mark it as the crop's latest model."""
+    path = _artifact_path(crop, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    mark_latest(crop, key)
+    return path
+
+
+def mark_latest(crop, key):
+    with open(os.path.join(REGISTRY_DIR, crop, "latest.json"), "w") as f:
+        json.dump({"key": key}, f)
+
+
+def clear_latest(crop):
+    """Stop serving a crop's model (its artifacts stay on disk for reuse)."""
+    pointer = os.path.join(REGISTRY_DIR, crop, "latest.json")
+    if os.path.exists(pointer):
+        os.remove(pointer)
+        return True
+    return False
+
+
+def load_latest(crop):
+    """Most recently registered artifact for a crop, or None."""
+    pointer = os.path.join(REGISTRY_DIR, crop, "latest.json")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return load(crop, json.load(f)["key"])
+
+
+def list_crops():
+    """Crops with a registered per-crop model; entries starting with "_" (e.g. the pooled model) are skipped."""
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    return sorted(d for d in os.listdir(REGISTRY_DIR)
+                  if not d.startswith("_") and os.path.exists(os.path.join(REGISTRY_DIR, d, "latest.json")))
@@ -1,10 +1,17 @@
 import os
+import json
 import time
+import datetime
 import pandas as pd
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import logging
 
+from api_client import TokenBucket, build_session, get_with_retry, NOAA_REQUESTS_PER_SECOND
+import climate_store
+import instrumentation
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
@@ -18,45 +25,91 @@ BASE_URL = "https://www.ncdc.noaa.gov/cdo-web/api/v2/data"
 START_YEAR = 2010
 END_YEAR = 2024
 DATA_VARS = ["TMAX", "TMIN", "PRCP"]
+PAGE_LIMIT = 1000
+MAX_WORKERS = 8
 ROOT_OUTPUT_DIR = "data/raw/climate_noaa"
+PAGE_CACHE_DIR = os.path.join(ROOT_OUTPUT_DIR, "_pages")
 STATION_MAP_PATH = "data/raw/county_station_map_2.csv"
+# Pages for the year still in progress keep growing; reuse them only this long
+OPEN_YEAR_PAGE_TTL_SECONDS = 24 * 3600
+
+
+def _page_path(station_id, year, offset):
+    return os.path.join(PAGE_CACHE_DIR, station_id.replace(":", "_"), str(year), f"{offset}.json")
+
+
+def _written_after_year(path, year):
+    """True when `path` was written once `year` had ended, so it holds the complete year."""
+    return os.path.getmtime(path) >= datetime.datetime(year + 1, 1, 1).timestamp()
+
+
+def _page_is_fresh(path, year):
+    if not os.path.exists(path):
+        return False
+    if _written_after_year(path, year):
+        return True
+    # Fetched while the year was still open: a partial snapshot, reused only within the TTL
+    return time.time() - os.path.getmtime(path) < OPEN_YEAR_PAGE_TTL_SECONDS
+
+
+def fetch_page(session, limiter, station_id, year, offset):
+    """Fetch one page of NOAA results, reusing the on-disk copy if a previous run already got it."""
+    path = _page_path(station_id, year, offset)
+    if _page_is_fresh(path, year):
+        with open(path) as f:
+            return json.load(f)
 
-# Read validated station map (ensure your header matches this exactly)
-station_map = pd.read_csv(STATION_MAP_PATH)
+    params = {
+        "datasetid": "GHCND",
+        "stationid": station_id,
+        "startdate": f"{year}-01-01",
+        "enddate": f"{year}-12-31",
+        "datatypeid": DATA_VARS,
+        "limit": PAGE_LIMIT,
+        "offset": offset,
+        "units": "metric",
+        "format": "json"
+    }
+    response = get_with_retry(session, BASE_URL, params=params, limiter=limiter)
+    # NOAA returns an empty body (not an empty list) when a station has no data
+    payload = response.json() if response.content.strip() else {}
+    # Empty answers aren't cached, so station-years with no data yet are asked again next run
+    if not payload.get("results"):
+        return payload
 
-def fetch_daily_data(station_id, year):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+    return payload
+
+
+def fetch_daily_data(station_id, year, session=None, limiter=None):
     """Fetch NOAA daily data for a station and year."""
     logging.info(f"Fetching {year} data for {station_id}")
+    session = session or build_session(headers=HEADERS)
+    limiter = limiter or TokenBucket(NOAA_REQUESTS_PER_SECOND)
     all_data = []
     offset = 1
 
     while True:
-        params = {
-            "datasetid": "GHCND",
-            "stationid": station_id,
-            "startdate": f"{year}-01-01",
-            "enddate": f"{year}-12-31",
-            "datatypeid": DATA_VARS,
-            "limit": 1000,
-            "offset": offset,
-            "units": "metric",
-            "format": "json"
-        }
         try:
-            response = requests.get(BASE_URL, headers=HEADERS, params=params, timeout=30)
-            response.raise_for_status()
-            page = response.json().get("results", [])
-            if not page:
-                break
-            all_data.extend(page)
-            if len(page) < 1000:
-                break
-            offset += 1000
-            time.sleep(1)
+            payload = fetch_page(session, limiter, station_id, year, offset)
         except requests.exceptions.RequestException as e:
             logging.error(f"Failed to fetch {year} for {station_id}: {e}")
             return None
 
+        page = payload.get("results", [])
+        if not page:
+            break
+        all_data.extend(page)
+
+        total = payload.get("metadata", {}).get("resultset", {}).get("count")
+        offset += PAGE_LIMIT
+        if len(page) < PAGE_LIMIT or (total is not None and offset > total):
+            break
+
     if not all_data:
         return None
 
@@ -66,28 +119,54 @@ def fetch_daily_data(station_id, year):
     df["year"] = year
     return df
 
-# Main loop
-for _, row in station_map.iterrows():
-    county = row["county"].strip().replace(" ", "_")
-    station_id = row["station_id"]
 
-    county_dir = os.path.join(ROOT_OUTPUT_DIR, county)
-    os.makedirs(county_dir, exist_ok=True)
+def _collect_station_year(session, limiter, county, station_id, year):
+    df = fetch_daily_data(station_id, year, session=session, limiter=limiter)
+    if df is None:
+        logging.warning(f"⚠ No data for {county} in {year}")
+        return False
+    output_path = climate_store.write_partition(df, county, year)
+    logging.info(f"✔ Saved: {output_path}")
+    return True
+
+
+@instrumentation.traced("fetch")
+def collect_climate_data(station_map, start_year=START_YEAR, end_year=END_YEAR, max_workers=MAX_WORKERS,
+                         requests_per_second=NOAA_REQUESTS_PER_SECOND):
+    """Download every missing station-year concurrently under one shared NOAA rate limit."""
+    session = build_session(pool_size=max_workers, headers=HEADERS)
+    limiter = TokenBucket(requests_per_second)
+
+    jobs = []
+    for _, row in station_map.iterrows():
+        county = row["county"].strip().replace(" ", "_")
+        station_id = row["station_id"]
+
+        for year in range(start_year, end_year + 1):
+            # Partitions saved before their year ended are partial and fetched again
+            if (climate_store.has_partition(county, year)
+                    and _written_after_year(climate_store.partition_path(county, year), year)):
+                logging.info(f"✓ Already exists: {county} {year}")
+                continue
+            jobs.append((county, station_id, year))
+
+    logging.info(f"Queued {len(jobs)} station-years across {max_workers} workers")
+    saved = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_collect_station_year, session, limiter, *job) for job in jobs]
+        for future in as_completed(futures):
+            saved += future.result()
+    return saved
 
-    for year in range(START_YEAR, END_YEAR + 1):
-        filename = f"{county}_{year}.csv"
-        output_path = os.path.join(county_dir, filename)
 
-        if os.path.exists(output_path):
-            logging.info(f"✓ Already exists: {output_path}")
-            continue
+def main():
+    # Pick up anything downloaded by the old one-CSV-per-county-year collector
+    climate_store.migrate_csv_tree(ROOT_OUTPUT_DIR)
+    # Read validated station map (ensure your header matches this exactly)
+    station_map = pd.read_csv(STATION_MAP_PATH)
+    saved = collect_climate_data(station_map)
+    logging.info(f"🎉 Finished downloading all NOAA daily climate data ({saved} new files).")
 
-        df = fetch_daily_data(station_id, year)
-        if df is not None:
-            df.to_csv(output_path, index=False)
-            logging.info(f"✔ Saved: {output_path}")
-        else:
-            logging.warning(f"⚠ No data for {county} in {year}")
-        time.sleep(1)
 
-logging.info("🎉 Finished downloading all NOAA daily climate data.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import os
+import ast
+import sys
+import json
+import glob
+import hashlib
+import argparse
+import subprocess
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import instrumentation
+
+# ------------------ CONFIG ------------------
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = "data/.pipeline_state.json"
+MAX_WORKERS = os.cpu_count() or 4
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ STAGES ------------------
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    # External stages pull from remote APIs: skipped in --offline runs, otherwise run every time
+    # because the remote data changes without any local input changing (their caches keep it cheap)
+    external: bool = False
+
+
+STAGES = [
+    Stage("download_county_boundaries", "download_county_boundaries.py",
+          inputs=["data/raw/us_counties"],
+          outputs=["data/raw/cv_county_boundaries.geojson"]),
+    Stage("data_collection", "data_collection.py", external=True,
+          outputs=["data/raw/usda_central_valley_all_ag_data_2010_2024.csv"]),
+    Stage("noaa_climate_collector", "noaa_climate_collector.py", external=True,
+          inputs=["data/raw/county_station_map_2.csv"],
+          outputs=["data/raw/climate_noaa_parquet"]),
+    Stage("feature_engineering", "feature_engineering.py",
+          inputs=["data/raw/climate_noaa_parquet"],
+          outputs=["data/processed/climate_features_2010_2024.csv",
+                   "data/processed/agroclimate_features_2010_2024.csv"]),
+    Stage("build_crop_specific_datasets", "build_crop_specific_datasets.py",
+          inputs=["data/raw/usda_central_valley_all_ag_data_2010_2024.csv",
+                  "data/processed/climate_features_2010_2024.csv"],
+          outputs=["data/processed/by_crop"]),
+    Stage("model_crop_yield", "model_crop_yield.py",
+          inputs=["data/processed/by_crop"],
+          outputs=["results/yield_models", "results/metrics_store.sqlite"]),
+    Stage("combine_model_metrics", "combine_model_metrics.py",
+          inputs=["results/metrics_store.sqlite"],
+          outputs=["results/model_results.csv"]),
+    Stage("climate_trend_analysis", "climate_trend_analysis.py",
+          inputs=["data/processed/by_crop"],
+          outputs=["results/climate_trends/*_climate_band_summary.csv",
+                   "results/climate_trends/*_yield_by_climate_band.png",
+                   "results/climate_trends/*_yield_trend.png"]),
+    Stage("climate_sensativity", "climate_sensativity.py",
+          inputs=["data/processed/by_crop"],
+          outputs=["results/climate_trends/crop_sensitivity_summary.csv",
+                   "results/climate_trends/crop_county_sensitivity.csv"]),
+    Stage("yield_loss_hot_years", "yield_loss_hot_years.py",
+          inputs=["data/processed/by_crop"],
+          outputs=["results/climate_trends/yield_loss_hot_years.csv"]),
+    Stage("hot_years_impact", "hot_years_impact.py",
+          inputs=["data/processed/by_crop", "data/raw/cv_county_boundaries.geojson"],
+          outputs=["results/climate_trends/all_crops_hot_year_yield_maps.png"]),
+    Stage("combined_hot_year_impact_map", "combined_hot_year_impact_map.py",
+          inputs=["data/processed/by_crop", "data/raw/cv_county_boundaries.geojson"],
+          outputs=["results/climate_trends/all_crops_yield_change_map.png"]),
+    Stage("creating_map", "creating_map.py",
+          inputs=["data/processed/by_crop", "data/raw/cv_county_boundaries.geojson"],
+          outputs=["data/processed/avg_yield_by_county.csv", "results/central_valley_yield_map.png"]),
+]
+
+
+# ------------------ FINGERPRINTS ------------------
+def _expand(pattern):
+    """Files matched by a path, directory (recursive) or glob pattern, sorted for stable hashing."""
+    paths = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith((".", "_"))]
+                files.extend(os.path.join(root, n) for n in names if not n.startswith("."))
+        elif os.path.isfile(path):
+            files.append(path)
+    return sorted(files)
+
+
+def local_imports(script, seen=None):
+    """The script plus every module under SRC_DIR it imports, directly or through other local modules."""
+    seen = set() if seen is None else seen
+    path = os.path.join(SRC_DIR, script)
+    if path in seen or not os.path.isfile(path):
+        return seen
+    seen.add(path)
+    with open(path) as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            local_imports(name.split(".")[0] + ".py", seen)
+    return seen
+
+
+class FileHasher:
+    """Content hashes memoised by (size, mtime) so unchanged files are not re-read on every run."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def file_hash(self, path):
+        stat = os.stat(path)
+        key = f"{stat.st_size}:{stat.st_mtime_ns}"
+        cached = self.cache.get(path)
+        if cached and cached["key"] == key:
+            return cached["sha256"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.cache[path] = {"key": key, "sha256": h.hexdigest()}
+        return h.hexdigest()
+
+    def fingerprint(self, stage):
+        h = hashlib.sha256()
+        # Shared modules count as code: editing crop_data.py reruns every stage that imports it
+        code = sorted(local_imports(stage.script))
+        for path in code + [p for pattern in stage.inputs for p in _expand(pattern)]:
+            h.update(path.encode())
+            h.update(self.file_hash(path).encode())
+        return h.hexdigest()
+
+
+def _outputs_exist(stage):
+    return all(_expand(pattern) for pattern in stage.outputs)
+
+
+def _overlaps(a, b):
+    """True if two declared paths/patterns can refer to the same files."""
+    a, b = a.split("*")[0].rstrip("/"), b.split("*")[0].rstrip("/")
+    return a == b or a.startswith(b + "/") or b.startswith(a + "/")
+
+
+def upstream_map(stages):
+    return {
+        stage.name: {
+            other.name for other in stages
+            if other is not stage and any(_overlaps(i, o) for i in stage.inputs for o in other.outputs)
+        }
+        for stage in stages
+    }
+
+
+# ------------------ STATE ------------------
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+# ------------------ RUNNER ------------------
+def _run_script(stage, offline=False):
+    env = dict(os.environ, BASEMAP_OFFLINE="1") if offline else None
+    # Stages run side by side in threads; each subprocess traces its own memory
+    with instrumentation.span(stage.name, "pipeline", memory=False, script=stage.script) as current:
+        result = subprocess.run([sys.executable, os.path.join(SRC_DIR, stage.script)], env=env)
+        current.set(returncode=result.returncode)
+    return result.returncode
+
+
+def run_pipeline(stages=STAGES, force=(), max_workers=MAX_WORKERS, dry_run=False, offline=False):
+    """Run stages whose script, inputs or outputs changed, launching independent ones in parallel."""
+    state = load_state()
+    hasher = FileHasher(state["files"])
+    upstream = upstream_map(stages)
+    by_name = {s.name: s for s in stages}
+    pending = set(by_name)
+    done, failed, ran = set(), set(), []
+
+    def is_stale(stage):
+        if stage.name in force or stage.external or not _outputs_exist(stage):
+            return True
+        # A dry run can't see the new outputs, so anything below a would-run stage is stale too
+        if dry_run and upstream[stage.name] & set(ran):
+            return True
+        fingerprint = hasher.fingerprint(stage)
+        return state["stages"].get(stage.name) != fingerprint
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for name in sorted(pending):
+                if upstream[name] & failed:
+                    logging.error(f"✗ Skipping {name}: an upstream stage failed")
+                    pending.discard(name)
+                    failed.add(name)
+                elif upstream[name] <= done:
+                    pending.discard(name)
+                    stage = by_name[name]
+                    if offline and stage.external:
+                        logging.info(f"– Offline, skipping: {name}")
+                        done.add(name)
+                        continue
+                    # Fingerprints are taken only once every upstream stage has finished writing
+                    if not is_stale(stage):
+                        logging.info(f"✓ Up to date: {name}")
+                        done.add(name)
+                    elif dry_run:
+                        logging.info(f"• Would run: {name}")
+                        ran.append(name)
+                        done.add(name)
+                    else:
+                        logging.info(f"▶ Running: {name}")
+                        running[pool.submit(_run_script, stage, offline)] = stage
+            if not running:
+                if pending and not any(upstream[n] <= done | failed for n in pending):
+                    raise RuntimeError(f"Stage dependencies form a cycle: {sorted(pending)}")
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                if future.result() != 0:
+                    logging.error(f"✗ {stage.name} exited with code {future.result()}")
+                    failed.add(stage.name)
+                    continue
+                state["stages"][stage.name] = hasher.fingerprint(stage)
+                save_state(state)
+                done.add(stage.name)
+                ran.append(stage.name)
+                logging.info(f"✔ Finished: {stage.name}")
+
+    if not dry_run:
+        save_state(state)
+    return ran, sorted(failed)
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Run the crop-climate pipeline, skipping stages whose inputs are unchanged.")
+    parser.add_argument("--force", nargs="*", default=[], help="Stage names to rerun regardless of fingerprints")
+    parser.add_argument("--only", nargs="*", help="Restrict the run to these stages")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="List the stages that would run")
+    parser.add_argument("--offline", action="store_true", help="Skip stages that download from NOAA/USDA and draw basemaps from cached tiles only")
+    parser.add_argument("--trace", action="store_true", help=f"Record timing/memory spans under {instrumentation.TRACE_ROOT}/")
+    args = parser.parse_args()
+
+    if args.trace:
+        trace_dir = instrumentation.new_trace_dir()
+        instrumentation.enable(trace_dir)
+
+    stages = [s for s in STAGES if not args.only or s.name in args.only]
+    ran, failed = run_pipeline(stages, force=set(args.force), max_workers=args.workers,
+                               dry_run=args.dry_run, offline=args.offline)
+    logging.info(f"🎉 Pipeline finished: {len(ran)} stage(s) run, {len(failed)} failed.")
+    if args.trace:
+        spans = instrumentation.load_trace_dir(trace_dir)
+        instrumentation.write_trace(spans, os.path.join(trace_dir, "trace.json"),
+                                    os.path.join(trace_dir, "trace.chrome.json"))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
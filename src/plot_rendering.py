@@ -0,0 +1,130 @@
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from PIL import Image
+
+import instrumentation
+
+# ------------------ CONFIG ------------------
+# Bump when a renderer's styling changes so every figure is redrawn once
+RENDER_VERSION = 1
+HASH_KEY = "InputHash"
+MAX_WORKERS = os.cpu_count() or 1
+
+
+# ------------------ JOBS ------------------
+def make_job(kind, out_path, title, **data):
+    """A plot described as plain data: renderer name, destination, title and JSON-serialisable inputs."""
+    data = {k: (v.tolist() if isinstance(v, (np.ndarray, pd.Series, pd.Index)) else v) for k, v in data.items()}
+    return {"kind": kind, "out_path": out_path, "title": title, "data": data}
+
+
+def job_hash(job):
+    payload = json.dumps({"v": RENDER_VERSION, "kind": job["kind"], "title": job["title"], "data": job["data"]},
+                         sort_keys=True, default=float)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def recorded_hash(path):
+    """Input hash stored in the PNG's text metadata by a previous render, if any."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with Image.open(path) as img:
+            return img.text.get(HASH_KEY)
+    except Exception:
+        return None
+
+
+# ------------------ RENDERERS ------------------
+def _boxplot(ax, title, x, y, xlabel, ylabel):
+    sns.boxplot(x=x, y=y, hue=x, palette="coolwarm", legend=False, ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+
+def _line(ax, title, x, y, xlabel, ylabel):
+    sns.lineplot(x=x, y=y, marker="o", ax=ax)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+
+def _actual_vs_pred(ax, title, y_true, y_pred):
+    y_true = np.asarray(y_true)
+    sns.scatterplot(x=y_true, y=y_pred, ax=ax)
+    ax.plot([y_true.min(), y_true.max()], [y_true.min(), y_true.max()], "--", color="red")
+    ax.set_xlabel("Actual Yield")
+    ax.set_ylabel("Predicted Yield")
+    ax.set_title(title)
+
+
+def _bar(ax, title, values, labels, xlabel=None):
+    values = np.asarray(values)
+    indices = np.argsort(values)[::-1]
+    sns.barplot(x=values[indices], y=np.array(labels)[indices], ax=ax)
+    ax.set_title(title)
+    if xlabel:
+        ax.set_xlabel(xlabel)
+
+
+def _heatmap(ax, title, values, rows, columns, label=None):
+    values = np.asarray(values, dtype=float)
+    # Grow with the matrix so labels stay legible for many crops or features
+    ax.figure.set_size_inches(max(6, 0.6 * len(columns) + 3), max(3, 0.35 * len(rows) + 2))
+    sns.heatmap(values, xticklabels=columns, yticklabels=rows, cmap="viridis", ax=ax,
+                cbar_kws={"label": label} if label else None)
+    ax.set_title(title)
+
+
+RENDERERS = {
+    "boxplot": (_boxplot, (6, 5)),
+    "line": (_line, (8, 4)),
+    "actual_vs_pred": (_actual_vs_pred, (6, 6)),
+    "bar": (_bar, (8, 4)),
+    "heatmap": (_heatmap, (8, 6)),
+}
+
+
+def render_job(job, digest):
+    draw, figsize = RENDERERS[job["kind"]]
+    with instrumentation.span("render_figure", "plot", kind=job["kind"], path=job["out_path"]):
+        fig, ax = plt.subplots(figsize=figsize)
+        try:
+            draw(ax, job["title"], **job["data"])
+            fig.tight_layout()
+            os.makedirs(os.path.dirname(job["out_path"]) or ".", exist_ok=True)
+            fig.savefig(job["out_path"], metadata={HASH_KEY: digest})
+        finally:
+            plt.close(fig)
+    return job["out_path"]
+
+
+# ------------------ STAGE ------------------
+@instrumentation.traced("plot")
+def render_jobs(jobs, max_workers=MAX_WORKERS, force=False):
+    """Render every job whose input hash differs from the one recorded in its existing PNG."""
+    todo = []
+    for job in jobs:
+        digest = job_hash(job)
+        if not force and recorded_hash(job["out_path"]) == digest:
+            continue
+        todo.append((job, digest))
+
+    logging.info(f"Rendering {len(todo)} of {len(jobs)} figure(s); {len(jobs) - len(todo)} unchanged")
+    if not todo:
+        return []
+    if max_workers <= 1 or len(todo) == 1:
+        return [render_job(job, digest) for job, digest in todo]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(todo))) as pool:
+        return list(pool.map(render_job, *zip(*todo)))
@@ -0,0 +1,191 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error, r2_score
+
+import model_registry
+import model_crop_yield
+
+# ------------------ CONFIG ------------------
+POOLED_NAME = "_pooled"
+OUTPUT_FILE = os.path.join(model_crop_yield.OUTPUT_DIR, "pooled_metrics.csv")
+POOLED_PARAMS = {
+    "max_iter": 300,
+    "learning_rate": 0.05,
+    "max_leaf_nodes": 15,
+    "min_samples_leaf": 10,
+    "l2_regularization": 1.0,
+    "random_state": 42,
+}
+CATEGORICAL_COLS = ["crop", "county"]
+ID_COLUMNS = ["county", "year", "scenario"]
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ DATA ------------------
+def load_pooled_frame(crops=None):
+    """Every modelable crop stacked into one frame, each keeping only the features it would use alone.
+
+    Rows keep their order within each crop, so positional splits match the per-crop models'.
+    Also returns the union of numeric feature columns.
+    """
+    files = sorted(f for f in os.listdir(model_crop_yield.INPUT_DIR) if f.endswith(".csv"))
+    frames, feature_cols = [], []
+    for file in files:
+        crop = file[:-len(".csv")]
+        if crops and crop not in crops:
+            continue
+        prepared = model_crop_yield.prepare_crop_data(os.path.join(model_crop_yield.INPUT_DIR, file))
+        if prepared is None:
+            continue
+        df, crop_features = prepared
+        frame = df[["county", "year"] + crop_features + [model_crop_yield.YIELD_COL_NAME]].reset_index(drop=True)
+        frame["crop"] = crop
+        frames.append(frame)
+        feature_cols += [col for col in crop_features if col not in feature_cols]
+    if not frames:
+        return pd.DataFrame(), []
+    return pd.concat(frames, ignore_index=True), feature_cols
+
+
+def encode(df, feature_cols, categories):
+    """Model input: numeric features (NaN where a crop lacks one) plus crop and county as categoricals."""
+    X = df.reindex(columns=feature_cols).astype(float)
+    for col in CATEGORICAL_COLS:
+        # Unseen crops or counties become missing categories rather than errors
+        X[col] = pd.Categorical(df[col], categories=categories[col])
+    return X
+
+
+def yield_scaler(df):
+    """Per-crop mean and std of yield; crops with a single value keep unit scale."""
+    stats = df.groupby("crop")[model_crop_yield.YIELD_COL_NAME].agg(["mean", "std"])
+    stats["std"] = stats["std"].where(stats["std"] > 0).fillna(1.0)
+    return stats
+
+
+# ------------------ MODEL ------------------
+def train_pooled_model(crops=None, params=POOLED_PARAMS):
+    """One gradient-boosted model over all crops, evaluated on each crop's original hold-out rows."""
+    df, feature_cols = load_pooled_frame(crops)
+    if df.empty:
+        return None
+
+    # Same split as model_crop_yield: by position within each crop's own dataset
+    test_mask = np.zeros(len(df), dtype=bool)
+    for crop, idx in df.groupby("crop").indices.items():
+        _, test_pos = train_test_split(np.arange(len(idx)), test_size=model_crop_yield.TEST_SIZE,
+                                       random_state=model_crop_yield.SPLIT_SEED)
+        test_mask[idx[test_pos]] = True
+    train, test = df[~test_mask], df[test_mask]
+
+    categories = {col: sorted(df[col].unique()) for col in CATEGORICAL_COLS}
+    scaler = yield_scaler(train)
+    y_col = model_crop_yield.YIELD_COL_NAME
+    z_train = (train[y_col] - train["crop"].map(scaler["mean"])) / train["crop"].map(scaler["std"])
+
+    start = time.perf_counter()
+    model = HistGradientBoostingRegressor(**params, categorical_features="from_dtype")
+    model.fit(encode(train, feature_cols, categories), z_train)
+    fit_s = time.perf_counter() - start
+
+    artifact = {
+        "model": model,
+        "feature_cols": feature_cols,
+        "categories": categories,
+        "scaler": scaler,
+        "rows": len(df),
+    }
+    predicted = predict_frame(test, artifact)["predicted_yield"].to_numpy()
+    logging.info(f"Pooled model: {len(train):,} training rows across {len(categories['crop'])} crop(s) in {fit_s:.2f}s")
+
+    metrics = []
+    for crop, idx in test.groupby("crop").indices.items():
+        y_true = test[y_col].to_numpy()[idx]
+        y_pred = predicted[idx]
+        metrics.append({
+            "crop": crop,
+            "rows": int((df["crop"] == crop).sum()),
+            "test_rows": len(idx),
+            "r2": r2_score(y_true, y_pred) if len(idx) > 1 else np.nan,
+            "mae": mean_absolute_error(y_true, y_pred),
+        })
+    artifact["metrics"] = pd.DataFrame(metrics)
+    return artifact
+
+
+def predict_frame(df, artifact, crops=None):
+    """Predict yield for every row in a single model call.
+
+    Rows with a `crop` column are scored as that crop, and left NaN when `crops`
+    excludes it; otherwise every row is scored once per crop (all crops seen in
+    training by default) and stacked.
+    """
+    if "crop" not in df.columns:
+        crops = crops or artifact["categories"]["crop"]
+        df = pd.concat([df.assign(crop=crop) for crop in crops], ignore_index=True)
+    out = df[[col for col in ID_COLUMNS if col in df.columns] + ["crop"]].copy()
+    out["predicted_yield"] = np.nan
+    scored = df["crop"].isin(crops).to_numpy() if crops else np.ones(len(df), dtype=bool)
+    if not scored.any():
+        return out
+    df = df[scored]
+    z = artifact["model"].predict(encode(df, artifact["feature_cols"], artifact["categories"]))
+    scaler = artifact["scaler"]
+    # Crops the model never saw have no scale and stay NaN
+    out.loc[scored, "predicted_yield"] = (z * df["crop"].map(scaler["std"]).to_numpy()
+                                          + df["crop"].map(scaler["mean"]).to_numpy())
+    return out
+
+
+def _per_crop_baseline(crops):
+    """R²/MAE of each crop's registered forest on the same hold-out rows, where available."""
+    rows = []
+    for crop in crops:
+        artifact = model_registry.load_latest(crop)
+        if artifact is not None:
+            rows.append({"crop": crop, "forest_r2": artifact["r2"], "forest_mae": artifact["mae"]})
+    return pd.DataFrame(rows, columns=["crop", "forest_r2", "forest_mae"])
+
+
+def model_yield_pooled(params=POOLED_PARAMS):
+    """Train (or reuse) the pooled model and write per-crop metrics next to the per-crop forests'."""
+    files = sorted(f for f in os.listdir(model_crop_yield.INPUT_DIR) if f.endswith(".csv"))
+    data_hash = {f: model_registry.file_hash(os.path.join(model_crop_yield.INPUT_DIR, f)) for f in files}
+    hyperparameters = {"model": params, "test_size": model_crop_yield.TEST_SIZE,
+                       "split_seed": model_crop_yield.SPLIT_SEED}
+    key = model_registry.registry_key(data_hash, hyperparameters)
+
+    artifact = model_registry.load(POOLED_NAME, key)
+    if artifact is not None:
+        logging.info(f"✓ Loaded registered pooled model {key}")
+        model_registry.mark_latest(POOLED_NAME, key)
+    else:
+        artifact = train_pooled_model(params=params)
+        if artifact is None:
+            logging.warning("No crop datasets could be modeled.")
+            return None
+        model_registry.save(POOLED_NAME, key, artifact)
+
+    metrics = artifact["metrics"].merge(_per_crop_baseline(artifact["metrics"]["crop"]), on="crop", how="left")
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    metrics.to_csv(OUTPUT_FILE, index=False)
+    for row in metrics.itertuples():
+        logging.info(f"{row.crop} – pooled R²: {row.r2:.3f}, MAE: {row.mae:.2f} "
+                     f"(forest R²: {row.forest_r2:.3f}, MAE: {row.forest_mae:.2f})")
+    logging.info(f"✔ Saved pooled-model metrics to {OUTPUT_FILE}")
+    return artifact
+
+
+# ------------------ ENTRY ------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train one gradient-boosted yield model across all crops.")
+    parser.parse_args()
+    model_yield_pooled()
@@ -0,0 +1,158 @@
+import os
+import time
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import model_registry
+import pooled_yield_model
+
+# ------------------ CONFIG ------------------
+CHUNK_SIZE = 200_000
+ID_COLUMNS = ["county", "year", "scenario"]
+# Pinned so every chunk has one schema, whatever a chunk's missing values make pandas infer
+OUTPUT_DTYPES = {"county": "string", "year": "Int64", "scenario": "string", "crop": "string",
+                 "predicted_yield": "float64"}
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ MODELS ------------------
+def load_models(crops=None, n_jobs=None):
+    """Latest registered artifact per crop (all registered crops by default)."""
+    models = {}
+    for crop in crops or model_registry.list_crops():
+        artifact = model_registry.load_latest(crop)
+        if artifact is None:
+            logging.warning(f"No registered model for {crop}, skipping.")
+            continue
+        if n_jobs is not None:
+            artifact["model"].n_jobs = n_jobs
+        models[crop] = artifact
+    if not models:
+        raise FileNotFoundError(f"No trained models found in {model_registry.REGISTRY_DIR}; run model_crop_yield.py first.")
+    return models
+
+
+def load_pooled():
+    """Latest registered multi-crop model."""
+    artifact = model_registry.load_latest(pooled_yield_model.POOLED_NAME)
+    if artifact is None:
+        raise FileNotFoundError(f"No pooled model found in {model_registry.REGISTRY_DIR}; run pooled_yield_model.py first.")
+    return artifact
+
+
+# ------------------ SCORING ------------------
+def score_artifact(df, artifact):
+    """Predicted yield of one crop's registered artifact for every row of `df`."""
+    # Features absent from the input become NaN and take the training mean via the imputer
+    X = df.reindex(columns=artifact["feature_cols"]).astype(float)
+    return artifact["model"].predict(artifact["imputer"].transform(X))
+
+
+def predict_frame(df, models):
+    """Predict yield for every row.
+
+    Rows with a `crop` column are scored by that crop's model only; otherwise
+    every row is scored by every model and the result is stacked with a `crop`
+    column.
+    """
+    id_cols = [col for col in ID_COLUMNS if col in df.columns]
+    if "crop" in df.columns:
+        out = df[id_cols + ["crop"]].copy()
+        out["predicted_yield"] = np.nan
+        for crop, idx in df.groupby("crop", sort=False).groups.items():
+            if crop in models:
+                out.loc[idx, "predicted_yield"] = score_artifact(df.loc[idx], models[crop])
+        return out
+
+    parts = []
+    for crop, artifact in models.items():
+        part = df[id_cols].copy()
+        part["crop"] = crop
+        part["predicted_yield"] = score_artifact(df, artifact)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+# ------------------ STREAMING ------------------
+def iter_input_chunks(path, chunk_size=CHUNK_SIZE):
+    if path.endswith(".parquet"):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class _ChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._wrote_csv = False
+
+    def write(self, df):
+        df = df.astype({col: dtype for col, dtype in OUTPUT_DTYPES.items() if col in df.columns})
+        if self.path.endswith(".parquet"):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            df.to_csv(self.path, mode="a" if self._wrote_csv else "w", header=not self._wrote_csv, index=False)
+            self._wrote_csv = True
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def predict_file(input_path, output_path, crops=None, chunk_size=CHUNK_SIZE, n_jobs=None, pooled=False):
+    """Stream a CSV/Parquet file through the crop models, writing predictions chunk by chunk.
+
+    With `pooled`, the single multi-crop model scores every crop instead of the per-crop models.
+    """
+    if pooled:
+        artifact = load_pooled()
+        models = crops or artifact["categories"]["crop"]
+        score = lambda chunk: pooled_yield_model.predict_frame(chunk, artifact, crops)
+    else:
+        models = load_models(crops, n_jobs=n_jobs)
+        score = lambda chunk: predict_frame(chunk, models)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = _ChunkWriter(output_path)
+    rows, start = 0, time.perf_counter()
+    try:
+        for chunk in iter_input_chunks(input_path, chunk_size):
+            writer.write(score(chunk))
+            rows += len(chunk)
+            elapsed = time.perf_counter() - start
+            logging.info(f"Scored {rows:,} rows ({rows / elapsed:,.0f} rows/s)")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"✔ Saved predictions for {rows:,} rows × {len(models)} crop(s) to {output_path} "
+                 f"in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return rows, elapsed
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Score county × year × scenario rows with the trained per-crop yield models.")
+    parser.add_argument("input", help="CSV or Parquet file with climate/area feature columns")
+    parser.add_argument("output", help="Destination .csv or .parquet file")
+    parser.add_argument("--crops", nargs="*", help="Crops to score (default: every registered model)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Trees scored in parallel per model")
+    parser.add_argument("--pooled", action="store_true", help="Score with the pooled multi-crop model")
+    args = parser.parse_args()
+    predict_file(args.input, args.output, crops=args.crops, chunk_size=args.chunk_size, n_jobs=args.n_jobs,
+                 pooled=args.pooled)
+
+
+if __name__ == "__main__":
+    main()
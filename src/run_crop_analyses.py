@@ -0,0 +1,29 @@
+import logging
+
+import crop_data
+from climate_trend_analysis import analyze_climate_trends
+from climate_sensativity import compute_sensitivity
+from yield_loss_hot_years import compute_yield_loss
+from combined_hot_year_impact_map import render_combined_map
+from creating_map import render_yield_map
+from hot_years_impact import render_hot_year_maps
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# ------------------ MAIN ------------------
+def main():
+    """Run every per-crop analysis in one process over a single parse of data/processed/by_crop."""
+    crops = crop_data.load_all_crops()
+    logging.info(f"Loaded {len(crops)} crop datasets")
+
+    analyze_climate_trends(crops)
+    compute_sensitivity(crops)
+    compute_yield_loss(crops)
+    render_combined_map(crops)
+    render_yield_map(crops)
+    render_hot_year_maps(crops)
+    logging.info("🎉 All crop analyses finished.")
+
+if __name__ == "__main__":
+    main()
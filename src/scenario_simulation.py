@@ -0,0 +1,152 @@
+import os
+import time
+import argparse
+import itertools
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import predict_yield
+
+# ------------------ CONFIG ------------------
+CLIMATE_FILE = "data/processed/climate_features_2010_2024.csv"
+CROP_DIR = "data/processed/by_crop"
+OUTPUT_FILE = "results/scenarios/yield_scenario_percentiles.csv"
+CLIMATE_COLS = ["tmax_mean", "tmin_mean", "prcp_total"]
+TEMP_SHIFTS = [0.0, 1.0, 2.0, 3.0]          # °C added to tmax_mean and tmin_mean
+PRCP_CHANGES = [-0.2, -0.1, 0.0, 0.1]       # fractional change in prcp_total
+SAMPLES_PER_COUNTY = 5000
+# Bootstrapped years get Gaussian jitter of this fraction of each county's
+# inter-annual std, so the sampled climate is continuous rather than 15 points
+JITTER = 0.25
+PERCENTILES = [5, 25, 50, 75, 95]
+SEED = 42
+
+# ------------------ LOGGING ------------------
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+# ------------------ INPUTS ------------------
+def load_climate_history(path=CLIMATE_FILE):
+    df = pd.read_csv(path)
+    df["county"] = df["county"].str.upper().str.replace(" ", "_")
+    return df.dropna(subset=CLIMATE_COLS).sort_values(["county", "year"]).reset_index(drop=True)
+
+
+def load_county_feature_means(crops, crop_dir=CROP_DIR):
+    """Historical per-county means of each crop's non-climate features (area, production, ...)."""
+    means = {}
+    for crop in crops:
+        path = os.path.join(crop_dir, f"{crop}.csv")
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path)
+        other = [c for c in df.select_dtypes("number").columns if c not in CLIMATE_COLS + ["year", "yield"]]
+        means[crop] = df.groupby("county")[other].mean()
+    return means
+
+
+# ------------------ SAMPLING ------------------
+def sample_climate(history, n_per_county, temp_shift, prcp_change, rng):
+    """Bootstrap county-years, jitter them and apply a warming/precipitation shift, all as array ops."""
+    counties, codes = np.unique(history["county"].to_numpy(), return_inverse=True)
+    counts = np.bincount(codes)
+    starts = np.r_[0, np.cumsum(counts)[:-1]]
+    values = history[CLIMATE_COLS].to_numpy(dtype=float)
+    stds = np.nan_to_num(history.groupby(codes)[CLIMATE_COLS].std().to_numpy())
+
+    sample_county = np.repeat(np.arange(len(counties)), n_per_county)
+    picks = starts[sample_county] + (rng.random(len(sample_county)) * counts[sample_county]).astype(int)
+    sampled = values[picks] + rng.standard_normal((len(picks), len(CLIMATE_COLS))) * JITTER * stds[sample_county]
+
+    sampled[:, 0:2] += temp_shift
+    sampled[:, 2] = np.maximum(sampled[:, 2] * (1 + prcp_change), 0)
+    frame = pd.DataFrame(sampled, columns=CLIMATE_COLS)
+    frame.insert(0, "county", counties[sample_county])
+    return frame
+
+
+# ------------------ WORKERS ------------------
+_MODELS = None
+
+
+def _init_worker(crops):
+    global _MODELS
+    _MODELS = predict_yield.load_models(crops, n_jobs=1)
+
+
+def _simulate_scenario(history, feature_means, n_per_county, temp_shift, prcp_change, seed):
+    """Simulate one scenario and return per crop × county yield distribution summaries."""
+    rng = np.random.default_rng(seed)
+    samples = sample_climate(history, n_per_county, temp_shift, prcp_change, rng)
+    rows = []
+    for crop, artifact in _MODELS.items():
+        batch = samples
+        if crop in feature_means:
+            batch = samples.join(feature_means[crop], on="county")
+        yields = predict_yield.score_artifact(batch, artifact)
+
+        frame = pd.DataFrame({"county": samples["county"], "yield": yields})
+        grouped = frame.groupby("county")["yield"]
+        summary = grouped.agg(["count", "mean", "std"])
+        quantiles = grouped.quantile([p / 100 for p in PERCENTILES]).unstack()
+        quantiles.columns = [f"p{p:02d}" for p in PERCENTILES]
+        summary = summary.join(quantiles).reset_index()
+        summary.insert(0, "crop", crop)
+        summary["temp_shift"] = temp_shift
+        summary["prcp_change"] = prcp_change
+        rows.append(summary)
+    return pd.concat(rows, ignore_index=True)
+
+
+# ------------------ ENGINE ------------------
+def run_simulation(crops=None, temp_shifts=TEMP_SHIFTS, prcp_changes=PRCP_CHANGES,
+                   n_per_county=SAMPLES_PER_COUNTY, max_workers=None, seed=SEED):
+    """Monte Carlo yield distributions for every crop, county and climate scenario."""
+    crops = list(predict_yield.load_models(crops).keys())
+    history = load_climate_history()
+    feature_means = load_county_feature_means(crops)
+    scenarios = list(itertools.product(temp_shifts, prcp_changes))
+    seeds = np.random.SeedSequence(seed).spawn(len(scenarios))
+    n_counties = history["county"].nunique()
+    total = len(scenarios) * n_counties * n_per_county
+    logging.info(f"Simulating {total:,} county-years × {len(crops)} crop(s) over {len(scenarios)} scenarios")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(crops,)) as pool:
+        futures = [
+            pool.submit(_simulate_scenario, history, feature_means, n_per_county, t, p, s)
+            for (t, p), s in zip(scenarios, seeds)
+        ]
+        results = pd.concat([f.result() for f in futures], ignore_index=True)
+    elapsed = time.perf_counter() - start
+    logging.info(f"Simulated {total:,} county-years in {elapsed:.1f}s ({total / elapsed:,.0f}/s)")
+
+    baseline = results[(results["temp_shift"] == 0) & (results["prcp_change"] == 0)]
+    if not baseline.empty:
+        base_mean = baseline.set_index(["crop", "county"])["mean"].rename("baseline_mean")
+        results = results.join(base_mean, on=["crop", "county"])
+        results["pct_change_vs_baseline"] = 100 * (results["mean"] - results["baseline_mean"]) / results["baseline_mean"]
+    return results
+
+
+# ------------------ ENTRY ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo crop-yield stress test under warming and precipitation shifts.")
+    parser.add_argument("--crops", nargs="*", help="Crops to simulate (default: every registered model)")
+    parser.add_argument("--samples", type=int, default=SAMPLES_PER_COUNTY, help="Synthetic years per county per scenario")
+    parser.add_argument("--temp-shifts", type=float, nargs="*", default=TEMP_SHIFTS)
+    parser.add_argument("--prcp-changes", type=float, nargs="*", default=PRCP_CHANGES)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    results = run_simulation(args.crops, args.temp_shifts, args.prcp_changes, args.samples, args.workers, args.seed)
+    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
+    results.to_csv(OUTPUT_FILE, index=False)
+    logging.info(f"✔ Saved scenario yield distributions to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
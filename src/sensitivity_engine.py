@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import statsmodels.api as sm
+
+# ------------------ CONFIG ------------------
+YIELD_COL = "yield"
+CLIMATE_VARS = ["tmax_mean", "tmin_mean", "prcp_total"]
+MIN_ROWS = 10
+
+
+# ------------------ ENGINE ------------------
+def batched_ols(df, group_cols, x_cols, y_col=YIELD_COL, min_rows=MIN_ROWS):
+    """Fit y ~ 1 + x_cols separately in every group with stacked normal equations.
+
+    Rows are sorted by group so X'X, X'y and y'y for all groups come from one
+    segmented sum; the small p x p systems are then inverted as a single batch.
+    Returns one row per group and term with coef, se, intercept, r_squared and n.
+    """
+    group_cols = list(group_cols)
+    data = df.dropna(subset=list(x_cols) + [y_col])
+    if not len(data):
+        return pd.DataFrame(columns=group_cols + ["term", "coef", "se", "intercept", "r_squared", "n"])
+    if group_cols:
+        data = data.sort_values(group_cols, kind="stable")
+        codes = data.groupby(group_cols, sort=False, observed=True).ngroup().to_numpy()
+        keys = data[group_cols].reset_index(drop=True)
+    else:
+        codes = np.zeros(len(data), dtype=int)
+        keys = pd.DataFrame(index=range(len(data)))
+    new_group = np.r_[True, codes[1:] != codes[:-1]]
+
+    starts = np.flatnonzero(new_group)
+    X = np.column_stack([np.ones(len(data))] + [data[c].to_numpy(dtype=float) for c in x_cols])
+    y = data[y_col].to_numpy(dtype=float)
+    p = X.shape[1]
+
+    n = np.diff(np.r_[starts, len(data)])
+    xtx = np.add.reduceat(X[:, :, None] * X[:, None, :], starts, axis=0)
+    xty = np.add.reduceat(X * y[:, None], starts, axis=0)
+    yty = np.add.reduceat(y * y, starts)
+    ysum = np.add.reduceat(y, starts)
+
+    # Groups that are too small or rank-deficient (e.g. constant x) get NaN rather than a pinv guess
+    valid = (n >= max(min_rows, p + 1)) & (np.linalg.matrix_rank(xtx) == p)
+    xtx_inv = np.full_like(xtx, np.nan)
+    if valid.any():
+        xtx_inv[valid] = np.linalg.inv(xtx[valid])
+    beta = np.einsum("gij,gj->gi", xtx_inv, xty)
+
+    ssr = yty - 2 * np.einsum("gi,gi->g", beta, xty) + np.einsum("gi,gij,gj->g", beta, xtx, beta)
+    sst = yty - ysum ** 2 / n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r_squared = 1 - ssr / sst
+        sigma2 = ssr / (n - p)
+    se = np.sqrt(np.clip(sigma2[:, None] * np.diagonal(xtx_inv, axis1=1, axis2=2), 0, None))
+
+    group_keys = keys.iloc[starts].reset_index(drop=True)
+    out = group_keys.loc[group_keys.index.repeat(p - 1)].reset_index(drop=True)
+    out["term"] = np.tile(list(x_cols), len(starts))
+    out["coef"] = beta[:, 1:].ravel()
+    out["se"] = se[:, 1:].ravel()
+    out["intercept"] = np.repeat(beta[:, 0], p - 1)
+    out["r_squared"] = np.repeat(r_squared, p - 1)
+    out["n"] = np.repeat(n, p - 1)
+    return out[valid.repeat(p - 1)].reset_index(drop=True)
+
+
+def sensitivity_table(df, group_cols=("crop",), climate_vars=CLIMATE_VARS, multivariate=False, y_col=YIELD_COL):
+    """Yield slopes for every group and climate variable in one table.
+
+    Univariate fits (one per variable) are labelled with the variable name in
+    `model`; with `multivariate=True` a joint fit on all variables is added
+    under `model="multivariate"`.
+    """
+    parts = [batched_ols(df, group_cols, [var], y_col).assign(model=var) for var in climate_vars]
+    if multivariate:
+        parts.append(batched_ols(df, group_cols, list(climate_vars), y_col).assign(model="multivariate"))
+    table = pd.concat(parts, ignore_index=True)
+    return table[list(group_cols) + ["model", "term", "coef", "se", "intercept", "r_squared", "n"]]
+
+
+# ------------------ DIAGNOSTICS ------------------
+def detailed_fit(df, x_cols, y_col=YIELD_COL):
+    """Full statsmodels OLS for a single group, for residual plots and diagnostic tests."""
+    data = df.dropna(subset=list(x_cols) + [y_col])
+    return sm.OLS(data[y_col], sm.add_constant(data[list(x_cols)])).fit()
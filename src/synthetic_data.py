@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+
+import climate_store
+
+# ------------------ CONFIG ------------------
+DEFAULT_SEED = 42
+MISSING_RATE = 0.03
+
+
+# ------------------ DAILY NOAA ------------------
+def county_names(n_counties):
+    return [f"County_{i:03d}" for i in range(n_counties)]
+
+
+def make_daily_climate(n_counties=15, years=range(2010, 2025), seed=DEFAULT_SEED):
+    """Seasonal daily TMAX/TMIN/PRCP for every county-year, with a few missing readings.
+
+    Values follow the NOAA CDO metric units used by the collector (°C, mm).
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for county_idx, county in enumerate(county_names(n_counties)):
+        dates = pd.date_range(f"{min(years)}-01-01", f"{max(years)}-12-31", freq="D")
+        n = len(dates)
+        season = np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 105) / 365.25)
+        offset = rng.normal(0, 2)
+        tmax = 24 + offset + 10 * season + rng.normal(0, 3, n)
+        tmin = tmax - 13 + rng.normal(0, 2, n)
+        prcp = np.where(rng.random(n) < 0.15 * (1 - season), rng.gamma(1.2, 6, n), 0.0)
+
+        df = pd.DataFrame({
+            "date": dates,
+            "TMAX": tmax.round(1),
+            "TMIN": tmin.round(1),
+            "PRCP": prcp.round(1),
+            "station": f"GHCND:USC{county_idx:08d}",
+            "county": county,
+            "year": dates.year,
+        })
+        for col in climate_store.VALUE_COLUMNS:
+            df.loc[rng.random(n) < MISSING_RATE, col] = np.nan
+        frames.append(df[df["year"].isin(list(years))])
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_csv_tree(daily, root):
+    """Lay the frame out like the original collector: <root>/<county>/<county>_<year>.csv."""
+    for (county, year), group in daily.groupby(["county", "year"]):
+        county_dir = os.path.join(root, county)
+        os.makedirs(county_dir, exist_ok=True)
+        out = group.drop(columns="county").assign(date=group["date"].dt.strftime("%Y-%m-%dT00:00:00"))
+        out.to_csv(os.path.join(county_dir, f"{county}_{year}.csv"), index=False)
+
+
+def write_parquet_store(daily, root):
+    for (county, year), group in daily.groupby(["county", "year"]):
+        climate_store.write_partition(group, county, year, root)
+
+
+# ------------------ USDA QUICKSTATS ------------------
+BASE_CROPS = ["CORN", "COTTON", "RICE", "TOMATOES", "BEANS", "WHEAT", "BARLEY", "ALMONDS", "WALNUTS", "GRAPES"]
+STATISTICS = {"YIELD": 1.0, "AREA HARVESTED": 4000.0, "AREA PLANTED": 4200.0, "PRODUCTION": 400000.0}
+
+
+def crop_names(n_crops):
+    extra = [f"CROP {i:03d}" for i in range(max(0, n_crops - len(BASE_CROPS)))]
+    return (BASE_CROPS + extra)[:n_crops]
+
+
+def annual_climate(daily):
+    grouped = daily.groupby(["county", "year"])
+    return pd.DataFrame({
+        "tmax_mean": grouped["TMAX"].mean(),
+        "tmin_mean": grouped["TMIN"].mean(),
+        "prcp_total": grouped["PRCP"].sum(),
+    }).reset_index()
+
+
+def make_usda_table(climate, n_crops=10, seed=DEFAULT_SEED):
+    """QuickStats-shaped rows (as saved by data_collection.py) for every county x year x crop x statistic.
+
+    `climate` is an annual county-year table; yields fall off with tmax_mean
+    above each crop's optimum so the downstream models have a signal to find.
+    """
+    rng = np.random.default_rng(seed)
+    crops = crop_names(n_crops)
+    base = climate[["county", "year", "tmax_mean"]].dropna()
+    frames = []
+    for crop_idx, crop in enumerate(crops):
+        # Counties report a crop in most but not all years
+        reported = base[rng.random(len(base)) < 0.85]
+        optimum = 22 + rng.normal(0, 1.5)
+        scale = 50 + 150 * rng.random()
+        heat = np.clip(reported["tmax_mean"].to_numpy() - optimum, 0, None)
+        crop_yield = scale * (1 - 0.04 * heat) * rng.lognormal(0, 0.08, len(reported))
+        area = rng.lognormal(np.log(STATISTICS["AREA HARVESTED"]), 0.6, len(reported))
+        values = {
+            "YIELD": crop_yield,
+            "AREA HARVESTED": area,
+            "AREA PLANTED": area * rng.uniform(1.0, 1.15, len(reported)),
+            "PRODUCTION": area * crop_yield,
+        }
+        for statistic, value in values.items():
+            frames.append(pd.DataFrame({
+                "year": reported["year"].to_numpy(),
+                "state": "CALIFORNIA",
+                "county": reported["county"].str.upper().str.replace("_", " ").to_numpy(),
+                "county_fips": f"{crop_idx:03d}",
+                "commodity": crop,
+                "description": f"{crop} - {statistic}",
+                "statistic": statistic,
+                "domain": "TOTAL",
+                "value": value.round(1),
+                "unit": "",
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# ------------------ PER-CROP DATASETS ------------------
+def make_crop_datasets(climate, n_crops=10, seed=DEFAULT_SEED):
+    """{crop stem: frame} shaped like build_crop_specific_datasets output, without running the builder."""
+    usda = make_usda_table(climate, n_crops, seed)
+    wide = usda.pivot_table(index=["county", "year", "commodity"], columns="statistic", values="value").reset_index()
+    wide.columns = [col.lower().replace(" ", "") for col in wide.columns]
+    wide["county"] = wide["county"].str.replace(" ", "_")
+    climate = climate.assign(county=climate["county"].str.upper())
+    merged = climate.merge(wide, on=["county", "year"], how="inner")
+    return {crop.lower().replace(" ", "_"): df.drop(columns="commodity").assign(commodity=crop)
+            for crop, df in merged.groupby("commodity")}
+
+
+def write_crop_datasets(crops, root):
+    os.makedirs(root, exist_ok=True)
+    for stem, df in crops.items():
+        df.to_csv(os.path.join(root, f"{stem}.csv"), index=False)